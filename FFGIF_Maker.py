@@ -3,79 +3,37 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import subprocess
+import io
 import os
 import sys
 import threading
-import shutil
-from datetime import datetime
+import queue
+import time
+import traceback
+
+from ffgif_engine import (
+    DEFAULT_RENDITIONS, ENCODE_MODES, ENCODER_BACKENDS, PALETTE_SAMPLE_METHODS, BuildCancelled, CancelToken,
+    append_run_log, build_gif, build_renditions, check_single_format, default_output_name, format_file_size,
+    get_available_backends, get_encoder_backend, get_frame_times, get_gap_durations, make_scale_string,
+    parse_renditions, sort_by_capture_time
+)
+
+# Decoded preview frames kept ahead of playback
+PREVIEW_BUFFER_FRAMES = 16
+
+# FFmpeg output window: lines kept on screen and refresh interval
+LOG_MAX_LINES = 2000
+LOG_PUMP_INTERVAL_MS = 100
 
 # Try to import PIL for GIF preview
 try:
     from PIL import Image, ImageTk
+    from ffgif_decode import ProxySequence, decode_preview_frames, get_preview_size
     HAS_PIL = True
 except ImportError:
     HAS_PIL = False
 
 
-def find_ffmpeg():
-    """Find FFmpeg binary, checking common locations."""
-    # Check PATH first
-    ffmpeg = shutil.which("ffmpeg")
-    if ffmpeg:
-        return ffmpeg
-
-    # Check common macOS locations
-    common_paths = [
-        "/opt/homebrew/bin/ffmpeg",  # Apple Silicon Homebrew
-        "/usr/local/bin/ffmpeg",      # Intel Homebrew
-        "/usr/bin/ffmpeg",            # System
-    ]
-    for path in common_paths:
-        if os.path.isfile(path) and os.access(path, os.X_OK):
-            return path
-
-    return None
-
-
-def check_ffmpeg():
-    """Check if FFmpeg is available."""
-    return find_ffmpeg() is not None
-
-
-def get_image_date(filepath):
-    """Get image creation date from EXIF or file metadata."""
-    try:
-        # Try to read EXIF data using exiftool if available
-        if shutil.which("exiftool"):
-            result = subprocess.run(
-                ["exiftool", "-DateTimeOriginal", "-s3", filepath],
-                capture_output=True, text=True
-            )
-            if result.stdout.strip():
-                # Parse EXIF date format: "2026:01:04 12:30:45"
-                date_str = result.stdout.strip().split()[0]
-                return date_str.replace(":", "")
-    except Exception:
-        pass
-
-    # Fall back to file modification time
-    try:
-        mtime = os.path.getmtime(filepath)
-        return datetime.fromtimestamp(mtime).strftime("%Y%m%d")
-    except Exception:
-        return datetime.now().strftime("%Y%m%d")
-
-
-def format_file_size(size_bytes):
-    """Format file size in human readable format."""
-    if size_bytes < 1024:
-        return f"{size_bytes} B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.1f} KB"
-    else:
-        return f"{size_bytes / (1024 * 1024):.2f} MB"
-
-
 def select_files():
     """Open file dialog to select multiple image files."""
     filetypes = [
@@ -85,27 +43,31 @@ def select_files():
     files = filedialog.askopenfilenames(filetypes=filetypes)
     if files:
         selected_files.clear()
-        selected_files.extend(files)
+        selected_files.extend(sorted(files))
 
         # Update display
         files_label_var.set(f"{len(files)} files selected")
 
-        # Get folder and extension from first file
-        first_file = files[0]
+        # Get folder from first file
+        first_file = selected_files[0]
         folder = os.path.dirname(first_file)
-        ext = os.path.splitext(first_file)[1].lstrip(".")
 
         folder_var.set(folder)
-        extension_var.set(ext)
 
         # Generate default output name
-        base_name = os.path.splitext(os.path.basename(first_file))[0]
-        date_stamp = get_image_date(first_file)
-        output_var.set(f"{base_name}_{date_stamp}.gif")
+        output_var.set(default_output_name(first_file))
 
-        # Clear status and preview
+        # Clear status and preview, then play the selected images
         update_status("")
         clear_preview()
+        load_sequence_preview()
+
+
+def select_scratch_dir():
+    """Open folder dialog to choose where temporary files go."""
+    folder = filedialog.askdirectory()
+    if folder:
+        scratch_dir_var.set(folder)
 
 
 def update_scale_ui(*args):
@@ -125,8 +87,7 @@ def get_scale_string():
     if mode == "factor":
         factor = scale_factor_var.get()
         try:
-            f = float(factor)
-            return f"iw*{f}:ih*{f}"
+            return make_scale_string(factor=factor)
         except ValueError:
             return "iw/2:ih/2"
     else:
@@ -168,6 +129,61 @@ def validate_inputs():
         except ValueError:
             return "Width and height must be valid integers"
 
+    if palette_sample_var.get() in ("stride", "random"):
+        try:
+            if int(palette_amount_var.get()) <= 0:
+                return "Palette sample N must be positive"
+        except ValueError:
+            return "Palette sample N must be a whole number"
+
+    if target_size_var.get().strip():
+        try:
+            if float(target_size_var.get()) <= 0:
+                return "Target size must be positive"
+        except ValueError:
+            return "Target size must be a valid number of MB"
+        if backend_var.get() != "ffmpeg":
+            return "Target size needs the FFmpeg encoder"
+
+    if dedupe_var.get():
+        try:
+            if float(dedupe_threshold_var.get()) < 0:
+                return "Duplicate threshold must not be negative"
+        except ValueError:
+            return "Duplicate threshold must be a valid number"
+
+    if frame_deltas_var.get():
+        try:
+            if not 0 <= float(frame_deltas_tolerance_var.get()) <= 255:
+                return "Frame delta tolerance must be between 0 and 255"
+        except ValueError:
+            return "Frame delta tolerance must be a valid number"
+
+    if backend_var.get() == "ffmpeg" or dedupe_var.get() or renditions_var.get():
+        try:
+            check_single_format(selected_files)
+        except ValueError as e:
+            return str(e)
+
+    scratch_dir = scratch_dir_var.get().strip()
+    if scratch_dir and not os.path.isdir(scratch_dir):
+        return "Scratch folder doesn't exist"
+
+    if renditions_var.get():
+        try:
+            parse_renditions(renditions_spec_var.get())
+        except ValueError as e:
+            return str(e)
+        if backend_var.get() != "ffmpeg":
+            return "Renditions need the FFmpeg encoder"
+        # Renditions come from one decode of every frame, without these steps
+        if dedupe_var.get():
+            return "Skipping duplicate frames doesn't apply to renditions"
+        if target_size_var.get().strip():
+            return "Fitting a size limit doesn't apply to renditions"
+        if frame_deltas_var.get():
+            return "Frame deltas don't apply to renditions"
+
     return None
 
 
@@ -178,24 +194,66 @@ def update_status(message, is_error=False):
 
 
 def append_ffmpeg_output(text):
-    """Append text to the FFmpeg output window."""
-    if show_ffmpeg_var.get():
+    """Queue text for the FFmpeg output window. Safe to call from any thread."""
+    ffmpeg_log.append(text)
+    ffmpeg_log_queue.put(text)
+
+
+def clear_ffmpeg_output():
+    """Clear the FFmpeg output window and log. Safe to call from any thread."""
+    ffmpeg_log.clear()
+    ffmpeg_log_queue.put(None)
+
+
+def trim_ffmpeg_text():
+    """Drop the oldest lines so the output window keeps a bounded scrollback."""
+    line_count = int(ffmpeg_text.index("end-1c").split(".")[0])
+    if line_count > LOG_MAX_LINES:
+        ffmpeg_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+
+
+def pump_ffmpeg_output():
+    """Move queued output into the FFmpeg output window in one batch."""
+    chunks = []
+    cleared = False
+    try:
+        while True:
+            text = ffmpeg_log_queue.get_nowait()
+            if text is None:
+                chunks.clear()
+                cleared = True
+            else:
+                chunks.append(text)
+    except queue.Empty:
+        pass
+
+    show_output = show_ffmpeg_var.get()
+    if cleared or (chunks and show_output):
         ffmpeg_text.config(state="normal")
-        ffmpeg_text.insert("end", text)
-        ffmpeg_text.see("end")
+        if cleared:
+            ffmpeg_text.delete("1.0", "end")
+        if chunks and show_output:
+            # Only the tail can remain visible, so skip rendering the rest
+            ffmpeg_text.insert("end", "".join(chunks[-LOG_MAX_LINES:]))
+            trim_ffmpeg_text()
+            ffmpeg_text.see("end")
         ffmpeg_text.config(state="disabled")
 
+    root.after(LOG_PUMP_INTERVAL_MS, pump_ffmpeg_output)
 
-def clear_ffmpeg_output():
-    """Clear the FFmpeg output window."""
-    ffmpeg_text.config(state="normal")
-    ffmpeg_text.delete("1.0", "end")
-    ffmpeg_text.config(state="disabled")
+
+def save_ffmpeg_log():
+    """Save the full FFmpeg log, including lines trimmed from the window."""
+    path = filedialog.asksaveasfilename(defaultextension=".log",
+                                        filetypes=[("Log files", "*.log"), ("All files", "*.*")])
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(ffmpeg_log))
 
 
 def update_window_size():
     """Update window size based on current state."""
-    base_height = 500  # Increased for preview
+    base_height = 1010  # Increased for the job list and build options
     if show_ffmpeg_var.get():
         root.geometry(f"800x{base_height + 225}")
     else:
@@ -205,60 +263,57 @@ def update_window_size():
 def toggle_ffmpeg_output(*args):
     """Show/hide the FFmpeg output frame."""
     if show_ffmpeg_var.get():
+        # Output is not rendered while hidden; refill with the log tail
+        ffmpeg_text.config(state="normal")
+        ffmpeg_text.delete("1.0", "end")
+        ffmpeg_text.insert("end", "".join(ffmpeg_log[-LOG_MAX_LINES:]))
+        trim_ffmpeg_text()
+        ffmpeg_text.see("end")
+        ffmpeg_text.config(state="disabled")
         ffmpeg_frame.grid(row=ffmpeg_row, column=0, columnspan=3, sticky="nsew", padx=10, pady=(0, 10))
     else:
         ffmpeg_frame.grid_remove()
     update_window_size()
 
 
-def run_ffmpeg_with_output(cmd, step_name):
-    """Run FFmpeg command and capture output."""
-    show_output = show_ffmpeg_var.get()
-
-    root.after(0, lambda: append_ffmpeg_output(f"\n{'='*50}\n{step_name}\n{'='*50}\n"))
-    root.after(0, lambda: append_ffmpeg_output(f"$ {' '.join(cmd)}\n\n"))
-
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    # FFmpeg outputs to stderr
-    output_lines = []
-    for line in process.stderr:
-        output_lines.append(line)
-        if show_output:
-            root.after(0, lambda l=line: append_ffmpeg_output(l))
-
-    process.wait()
-
-    if process.returncode != 0:
-        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=''.join(output_lines))
-
-    return ''.join(output_lines)
-
-
 def clear_preview():
     """Clear the GIF preview."""
-    global gif_frames, gif_animation_id
+    global gif_animation_id, current_photo
     if gif_animation_id:
         root.after_cancel(gif_animation_id)
         gif_animation_id = None
-    gif_frames.clear()
+    # Stop the background decoder; its queue is dropped with it
+    preview_stop_event.set()
+    stop_sequence_preview()
+    report_preview_shown(False)
+    current_photo = None
     preview_label.config(image='', text="No preview")
     preview_info_var.set("")
     open_button.config(state="disabled")
     last_output_path_var.set("")
 
 
-def load_gif_preview(gif_path):
-    """Load and display animated GIF preview."""
-    global gif_frames, gif_animation_id, current_frame
+def report_preview_shown(shown):
+    """Pass whether the preview's first frame was shown to the waiting callback, if any."""
+    global preview_shown_callback
+    callback, preview_shown_callback = preview_shown_callback, None
+    if callback:
+        callback(shown)
+
 
+def load_gif_preview(gif_path, on_shown=None):
+    """Load and display animated GIF preview.
+
+    on_shown is called with True once the first frame is on screen, or
+    with False if it never will be.
+    """
+    global gif_animation_id, preview_queue, preview_stop_event, preview_shown_callback
+
+    report_preview_shown(False)
+    preview_shown_callback = on_shown
     if not HAS_PIL:
         preview_label.config(text="PIL not installed\nClick 'Open GIF' to view")
+        report_preview_shown(False)
         return
 
     try:
@@ -266,53 +321,162 @@ def load_gif_preview(gif_path):
         file_size = os.path.getsize(gif_path)
         size_str = format_file_size(file_size)
 
-        # Load GIF
-        gif = Image.open(gif_path)
-        width, height = gif.size
+        # Read dimensions only; frames are decoded in the background
+        with Image.open(gif_path) as gif:
+            width, height = gif.size
 
-        # Calculate preview size (max 300px on either dimension)
-        max_preview = 250
-        scale = min(max_preview / width, max_preview / height, 1.0)
-        preview_width = int(width * scale)
-        preview_height = int(height * scale)
+        preview_size = get_preview_size(width, height)
 
-        # Extract all frames
-        gif_frames.clear()
-        try:
-            while True:
-                frame = gif.copy()
-                frame = frame.resize((preview_width, preview_height), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(frame)
-                gif_frames.append(photo)
-                gif.seek(gif.tell() + 1)
-        except EOFError:
-            pass
-
-        # Get frame duration
-        try:
-            frame_duration = gif.info.get('duration', 100)
-        except:
-            frame_duration = 100
+        # Update info label; frame count follows once the decoder has seen them all
+        preview_info_var.set(f"{width}x{height} px  |  {size_str}")
 
-        # Update info label
-        preview_info_var.set(f"{width}x{height} px  |  {len(gif_frames)} frames  |  {size_str}")
+        def show_frame_count(count):
+            if not stop_event.is_set():
+                preview_info_var.set(f"{width}x{height} px  |  {count} frames  |  {size_str}")
+
+        def on_frame_count(count):
+            root.after(0, lambda: show_frame_count(count))
+
+        # Stop any previous decoder and animation before starting fresh
+        preview_stop_event.set()
+        if gif_animation_id:
+            root.after_cancel(gif_animation_id)
+            gif_animation_id = None
+        stop_event = threading.Event()
+        frame_queue = queue.Queue(maxsize=PREVIEW_BUFFER_FRAMES)
+        preview_stop_event = stop_event
+        preview_queue = frame_queue
+        thread = threading.Thread(target=decode_preview_frames,
+                                  args=(gif_path, preview_size, frame_queue, stop_event, on_frame_count))
+        thread.daemon = True
+        thread.start()
 
         # Start animation
-        current_frame = 0
-        animate_gif(frame_duration)
+        animate_gif()
 
     except Exception as e:
         preview_label.config(text=f"Preview error:\n{str(e)[:50]}")
+        report_preview_shown(False)
+
+
+def animate_gif():
+    """Show the next buffered preview frame and schedule the one after."""
+    global gif_animation_id, current_photo
+
+    try:
+        frame, duration = preview_queue.get_nowait()
+    except queue.Empty:
+        # Decoder hasn't caught up yet; check again shortly
+        if not preview_stop_event.is_set():
+            gif_animation_id = root.after(10, animate_gif)
+        return
+
+    current_photo = ImageTk.PhotoImage(frame)
+    preview_label.config(image=current_photo, text="")
+    report_preview_shown(True)
+    gif_animation_id = root.after(duration, animate_gif)
+
 
+def load_sequence_preview():
+    """Play the selected images from small proxy frames, before anything is encoded."""
+    global proxy_sequence, proxy_index, proxy_playing
 
-def animate_gif(duration):
-    """Animate the GIF preview."""
-    global gif_animation_id, current_frame
+    if not HAS_PIL or not selected_files:
+        return
+    stop_sequence_preview()
+    proxy_sequence = ProxySequence(selected_files)
+    proxy_index = 0
+    proxy_playing = True
+    scrub_scale.config(to=len(selected_files) - 1, state="normal")
+    scrub_scale.set(0)
+    play_button.config(text="Pause", state="normal")
+    animate_sequence_preview()
+
+
+def stop_sequence_preview():
+    """Stop proxy playback and the threads loading proxy frames."""
+    global proxy_sequence, proxy_animation_id, proxy_playing
+    if proxy_animation_id:
+        root.after_cancel(proxy_animation_id)
+        proxy_animation_id = None
+    if proxy_sequence:
+        proxy_sequence.close()
+        proxy_sequence = None
+    proxy_playing = False
+    play_button.config(text="Play", state="disabled")
+    scrub_scale.config(state="disabled")
+
+
+def get_sequence_frame_delay():
+    """Milliseconds per frame at the chosen frame rate (4 fps while it isn't valid)."""
+    try:
+        fps = float(framerate_var.get())
+    except ValueError:
+        fps = 4
+    return max(1, int(1000 / fps)) if fps > 0 else 250
 
-    if gif_frames:
-        preview_label.config(image=gif_frames[current_frame], text="")
-        current_frame = (current_frame + 1) % len(gif_frames)
-        gif_animation_id = root.after(duration, lambda: animate_gif(duration))
+
+def animate_sequence_preview():
+    """Show the current proxy frame and, while playing, schedule the next one."""
+    global proxy_animation_id, current_photo
+
+    proxy_animation_id = None
+    data = proxy_sequence.get(proxy_index)
+    frame_count = len(proxy_sequence.files)
+    if data is None:
+        # Not loaded yet; check again shortly
+        proxy_animation_id = root.after(10, animate_sequence_preview)
+        return
+
+    if data:
+        current_photo = ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+        preview_label.config(image=current_photo, text="")
+    else:
+        current_photo = None
+        preview_label.config(image='', text="Can't read image")
+    loaded = proxy_sequence.loaded_count()
+    info = f"Frame {proxy_index + 1}/{frame_count}  |  {os.path.basename(proxy_sequence.files[proxy_index])}"
+    if loaded < frame_count:
+        info += f"\n{loaded}/{frame_count} proxies ready"
+    preview_info_var.set(info)
+    scrub_scale.set(proxy_index)
+
+    if proxy_playing:
+        proxy_animation_id = root.after(get_sequence_frame_delay(), step_sequence_preview)
+
+
+def step_sequence_preview():
+    """Advance proxy playback by one frame, looping at the end."""
+    global proxy_index
+    proxy_index = (proxy_index + 1) % len(proxy_sequence.files)
+    animate_sequence_preview()
+
+
+def toggle_sequence_playback():
+    """Play or pause the proxy preview."""
+    global proxy_playing
+    if proxy_sequence is None:
+        return
+    proxy_playing = not proxy_playing
+    play_button.config(text="Pause" if proxy_playing else "Play")
+    if proxy_animation_id:
+        root.after_cancel(proxy_animation_id)
+    animate_sequence_preview()
+
+
+def scrub_sequence_preview(value):
+    """Jump the proxy preview to the frame under the scrubber."""
+    global proxy_index
+    index = int(float(value))
+    # Ignore the scrubber following playback
+    if proxy_sequence is None or index == proxy_index:
+        return
+    proxy_index = index
+    # Load the frames around the new position first
+    proxy_sequence.seek(index)
+    if proxy_animation_id:
+        root.after_cancel(proxy_animation_id)
+    animate_sequence_preview()
 
 
 def open_gif():
@@ -327,118 +491,334 @@ def open_gif():
             subprocess.run(["xdg-open", path])
 
 
-def show_preview(output_path):
-    """Show the generated GIF in the preview area."""
+def show_preview(output_path, on_shown=None):
+    """Show the generated GIF in the preview area (see load_gif_preview for on_shown)."""
+    stop_sequence_preview()
     last_output_path_var.set(output_path)
     open_button.config(state="normal")
-    load_gif_preview(output_path)
+    load_gif_preview(output_path, on_shown)
+
+
+def make_run_record(job, status, result=None, spans=(), error=None):
+    """Describe one build for the run log: settings, outcome, stage spans and resource usage.
+
+    Span starts count from when the job started.
+    """
+    record = {
+        "time": time.time(),
+        "job": job["id"],
+        "output": os.path.join(job["folder"], job["output"]),
+        "status": status,
+        "error": error,
+        "files": len(job["files"]),
+        "framerate": job["framerate"],
+        "scale": job["scale"],
+        "backend": job["backend"],
+        "encode_mode": job["encode_mode"],
+        "renditions": len(job["renditions"]) if job["renditions"] else None,
+        "elapsed": time.perf_counter() - job["start_time"],
+        "spans": list(spans),
+        "ffmpeg_usage": job["cancel"].get_usage(),
+    }
+    if result:
+        for key in ("frames", "bytes", "fps", "peak_rss", "usage"):
+            record[key] = result.get(key)
+    return record
+
+
+def format_run_breakdown(record):
+    """Summarize a run record in one line for the window."""
+    parts = [f"{span['name']} {span['duration']:.2f}s" for span in record["spans"]]
+    line = f"Last run (job {record['job']}, {record['status'].lower()}): " + (", ".join(parts) or "no stages")
+    if record.get("fps"):
+        line += f"  |  {record['fps']:.1f} fps"
+    ffmpeg_usage = record["ffmpeg_usage"]
+    if ffmpeg_usage["processes"]:
+        line += f"  |  FFmpeg CPU {ffmpeg_usage['cpu_time']:.1f}s"
+        if ffmpeg_usage["peak_rss"]:
+            line += f", peak {format_file_size(ffmpeg_usage['peak_rss'])}"
+    usage = record.get("usage") or {}
+    if usage.get("cpu_time") is not None:
+        line += f"  |  app CPU {usage['cpu_time']:.1f}s"
+    # Bytes moved by the app and its FFmpeg processes together
+    counters = [counts for counts in (usage, ffmpeg_usage) if counts.get("bytes_read") is not None]
+    if counters:
+        line += (f"  |  read {format_file_size(sum(counts['bytes_read'] for counts in counters))}, wrote "
+                 f"{format_file_size(sum(counts['bytes_written'] for counts in counters))}")
+    return line
+
+
+def write_run_record(record):
+    """Append a run record to the run log and show its breakdown."""
+    try:
+        append_run_log(record)
+    except OSError as e:
+        append_ffmpeg_output(f"Couldn't write the run log: {e}\n")
+    run_breakdown_var.set(format_run_breakdown(record))
 
 
-def create_gif_thread(folder, extension, framerate, scale, output):
-    """Run GIF creation in a separate thread to prevent UI freeze."""
-    # Handle case-insensitive extension matching
-    ext_lower = extension.lower()
-    ext_upper = extension.upper()
+def log_run(job, record, preview_path=None):
+    """Record a finished build, after timing its preview loading if there is one."""
+    if preview_path is None:
+        write_run_record(record)
+        return
+    preview_start = time.perf_counter()
 
-    # Try to find files with either case
-    input_pattern_lower = os.path.join(folder, f"*.{ext_lower}")
-    input_pattern_upper = os.path.join(folder, f"*.{ext_upper}")
+    def on_preview_shown(shown):
+        if shown:
+            record["spans"].append({"name": "preview", "start": preview_start - job["start_time"],
+                                    "duration": time.perf_counter() - preview_start})
+        write_run_record(record)
 
-    # Check which pattern has files
-    import glob
-    files_lower = glob.glob(input_pattern_lower)
-    files_upper = glob.glob(input_pattern_upper)
+    show_preview(preview_path, on_preview_shown)
 
-    if files_upper:
-        input_pattern = input_pattern_upper
-    elif files_lower:
-        input_pattern = input_pattern_lower
-    else:
-        root.after(0, lambda: update_status(f"Error: No .{extension} files found in folder", is_error=True))
-        root.after(0, lambda: set_ui_state(True))
-        return
 
-    palette_path = os.path.join(folder, "palette.png")
-    output_path = os.path.join(folder, output)
+def set_progress(percent, info):
+    """Update the progress bar and the progress details line."""
+    progress_var.set(percent)
+    progress_info_var.set(info)
 
-    try:
-        # Clear previous output and preview
-        root.after(0, clear_ffmpeg_output)
-        root.after(0, clear_preview)
-
-        # Update progress - Step 1
-        root.after(0, lambda: progress_var.set(0))
-        root.after(0, lambda: update_status("Generating color palette..."))
-
-        # Get FFmpeg path
-        ffmpeg_bin = find_ffmpeg()
-
-        # Generate palette (reinit_filter 0 handles variable-sized images)
-        run_ffmpeg_with_output([
-            ffmpeg_bin, "-y", "-framerate", framerate,
-            "-reinit_filter", "0",
-            "-pattern_type", "glob", "-i", input_pattern,
-            "-vf", f"scale={scale},palettegen=stats_mode=diff",
-            palette_path
-        ], "Step 1: Generating palette")
-
-        # Update progress - Step 2
-        root.after(0, lambda: progress_var.set(50))
-        root.after(0, lambda: update_status("Creating GIF..."))
-
-        # Create GIF (reinit_filter 0 handles variable-sized images)
-        run_ffmpeg_with_output([
-            ffmpeg_bin, "-y", "-framerate", framerate,
-            "-reinit_filter", "0",
-            "-pattern_type", "glob", "-i", input_pattern,
-            "-i", palette_path,
-            "-lavfi", f"scale={scale}[s];[s][1:v]paletteuse=dither=floyd_steinberg",
-            "-loop", "0", output_path
-        ], "Step 2: Creating GIF")
 
-        # Complete
-        root.after(0, lambda: progress_var.set(100))
-        root.after(0, lambda: update_status(f"Saved: {output_path}"))
-        root.after(0, lambda: append_ffmpeg_output(f"\n{'='*50}\nComplete!\n{'='*50}\n"))
+def format_job_row(job):
+    """Build the job list columns for a job."""
+    elapsed = job["elapsed"]
+    if job["status"] == "Running":
+        elapsed = time.perf_counter() - job["start_time"]
+    time_str = f"{elapsed:.1f}s" if elapsed is not None else ""
+    progress_str = f"{job['percent']:.0f}%" if job["status"] == "Running" else ""
+    return (job["id"], job["output"], len(job["files"]), job["status"], progress_str, time_str)
+
+
+def refresh_job_row(job):
+    """Redraw one job's row in the job list."""
+    if jobs_tree.exists(str(job["id"])):
+        jobs_tree.item(str(job["id"]), values=format_job_row(job))
+
+
+def set_job_progress(job, percent, info):
+    """Record a job's progress; the progress bar follows the newest running job."""
+    job["percent"] = percent
+    refresh_job_row(job)
+    if job["id"] == active_job_id:
+        set_progress(percent, f"Job {job['id']}: {info}")
+
+
+def finish_job(job, status, message, is_error=False):
+    """Record a finished job and start the next queued ones."""
+    global active_job_id
+    job["status"] = status
+    job["elapsed"] = time.perf_counter() - job["start_time"]
+    refresh_job_row(job)
+    update_status(message, is_error)
+
+    if job["id"] == active_job_id:
+        # Let the progress bar follow another running job, if any
+        running = [other for other in jobs if other["status"] == "Running"]
+        active_job_id = running[-1]["id"] if running else None
+        if active_job_id is None:
+            progress_var.set(0)
+    start_queued_jobs()
+
+
+def create_gif_thread(job):
+    """Run one queued GIF build in a separate thread to prevent UI freeze."""
+    output_path = os.path.join(job["folder"], job["output"])
+
+    def log(text):
+        # Tag lines with the job number when builds overlap
+        append_ffmpeg_output(f"[{job['id']}] {text}" if text.strip() else text)
 
-        # Show preview
-        root.after(0, lambda: show_preview(output_path))
+    # Stage spans for the run log, timed from the job's start
+    spans = []
 
+    def add_build_spans(result, build_start):
+        offset = build_start - job["start_time"]
+        spans.extend(dict(span, start=span["start"] + offset) for span in result["spans"])
+
+    try:
+        if job["frame_order"] == "capture" or job["real_timing"]:
+            root.after(0, lambda: update_status(f"Job {job['id']}: Reading capture times..."))
+            step_start = time.perf_counter()
+            if job["frame_order"] == "capture":
+                job["files"], frame_times = sort_by_capture_time(job["files"])
+            else:
+                frame_times = get_frame_times(job["files"])
+            if job["real_timing"]:
+                job["durations"] = get_gap_durations(frame_times, job["framerate"])
+            spans.append({"name": "scan", "start": step_start - job["start_time"],
+                          "duration": time.perf_counter() - step_start})
+
+        build_start = time.perf_counter()
+        if job["renditions"]:
+            result = build_renditions(
+                job["files"], output_path, job["renditions"], job["framerate"], job["scale"], job["durations"],
+                work_dir=job["scratch_dir"], log=log, cancel=job["cancel"],
+                on_status=lambda message: root.after(0, lambda: update_status(f"Job {job['id']}: {message}")),
+                on_progress=lambda percent, info: root.after(0, lambda: set_job_progress(job, percent, info)))
+
+            # Complete: report every output's size and the total time
+            elapsed = result["elapsed"]
+            sizes = ", ".join(f"{os.path.basename(output['path'])} {format_file_size(output['bytes'])}"
+                              for output in result["outputs"])
+            summary = (f"{result['frames']} frames -> {len(result['outputs'])} renditions in {elapsed:.2f}s  |  "
+                       f"{format_file_size(result['bytes'])} total")
+            root.after(0, lambda: set_progress(100, summary))
+            root.after(0, lambda: finish_job(job, "Done", f"Saved ({elapsed:.2f}s): {sizes}"))
+
+            # Show preview of the first GIF, if any, and log the run
+            gif_outputs = [output["path"] for output in result["outputs"] if output["format"] == "gif"]
+            add_build_spans(result, build_start)
+            record = make_run_record(job, "Done", result, spans)
+            root.after(0, lambda: log_run(job, record, gif_outputs[0] if gif_outputs else None))
+            return
+
+        result = build_gif(
+            job["files"], output_path, job["framerate"], job["scale"], job["encode_mode"], job["durations"],
+            job["use_cache"], log=log, cancel=job["cancel"], dedupe_threshold=job["dedupe_threshold"],
+            backend=job["backend"], palette_sample=job["palette_sample"],
+            palette_sample_amount=job["palette_sample_amount"], target_bytes=job["target_bytes"],
+            predecode=job["predecode"], work_dir=job["scratch_dir"], frame_deltas=job["frame_deltas"],
+            on_status=lambda message: root.after(0, lambda: update_status(f"Job {job['id']}: {message}")),
+            on_progress=lambda percent, info: root.after(0, lambda: set_job_progress(job, percent, info)))
+
+        # Complete
+        elapsed = result["elapsed"]
+        if job["backend"] == "ffmpeg":
+            mode_name = ENCODE_MODES[job["encode_mode"]]
+        else:
+            mode_name = ENCODER_BACKENDS[job["backend"]]
+        summary = f"{result['frames']} frames in {elapsed:.2f}s  |  {result['fps']:.1f} fps"
+        if result["dropped_frames"]:
+            summary += (f"  |  {result['dropped_frames']} duplicates skipped "
+                        f"({format_file_size(result['dropped_source_bytes'])} of source images)")
+        if result["frame_deltas"]:
+            deltas = result["frame_deltas"]
+            summary += (f"  |  frame deltas {deltas['bytes_after'] / deltas['bytes_before'] - 1:+.0%} "
+                        f"(+{deltas['time']:.1f}s)")
+        root.after(0, lambda: set_progress(100, summary))
+        root.after(0, lambda: finish_job(job, "Done", f"Saved: {output_path} ({elapsed:.2f}s, {mode_name})"))
+
+        # Show preview and log the run
+        add_build_spans(result, build_start)
+        record = make_run_record(job, "Done", result, spans)
+        root.after(0, lambda: log_run(job, record, output_path))
+
+    except BuildCancelled:
+        record = make_run_record(job, "Cancelled", spans=spans)
+        root.after(0, lambda: finish_job(job, "Cancelled", f"Job {job['id']} cancelled"))
+        root.after(0, lambda: log_run(job, record))
     except subprocess.CalledProcessError as e:
         error_msg = e.stderr if e.stderr else str(e)
-        root.after(0, lambda: update_status(f"Error: FFmpeg failed", is_error=True))
-        root.after(0, lambda: append_ffmpeg_output(f"\nERROR: {error_msg}\n"))
-    finally:
-        # Always clean up palette file
-        try:
-            if os.path.exists(palette_path):
-                os.remove(palette_path)
-        except OSError:
-            pass
-
-        # Re-enable UI
-        root.after(0, lambda: set_ui_state(True))
+        log(f"\nERROR: {error_msg}\n")
+        record = make_run_record(job, "Failed", spans=spans, error=f"FFmpeg failed with exit code {e.returncode}")
+        root.after(0, lambda: finish_job(job, "Failed", f"Error: FFmpeg failed (job {job['id']})", is_error=True))
+        root.after(0, lambda: log_run(job, record))
+    except (OSError, ValueError) as e:
+        error_msg = str(e)
+        record = make_run_record(job, "Failed", spans=spans, error=error_msg)
+        root.after(0, lambda: finish_job(job, "Failed", f"Error: {error_msg}", is_error=True))
+        root.after(0, lambda: log_run(job, record))
+    except Exception as e:
+        # Anything else (e.g. Pillow or NumPy errors) must still finish the job and free its slot
+        log(f"\nERROR: {traceback.format_exc()}\n")
+        error_msg = f"{type(e).__name__}: {e}"
+        record = make_run_record(job, "Failed", spans=spans, error=error_msg)
+        root.after(0, lambda: finish_job(job, "Failed", f"Error: {error_msg}", is_error=True))
+        root.after(0, lambda: log_run(job, record))
 
 
-def set_ui_state(enabled):
-    """Enable or disable UI elements."""
-    state = "normal" if enabled else "disabled"
-    create_button.config(state=state, text="Create GIF" if enabled else "Creating...")
-    browse_button.config(state=state)
-    if enabled:
-        progress_var.set(0)
+def start_queued_jobs():
+    """Start queued jobs until the parallel job limit is reached."""
+    global active_job_id
+    try:
+        limit = max(1, int(max_jobs_var.get()))
+    except ValueError:
+        limit = 1
+
+    running = sum(1 for job in jobs if job["status"] == "Running")
+    for job in jobs:
+        if running >= limit:
+            break
+        if job["status"] != "Queued":
+            continue
+
+        if running == 0:
+            # Nothing else is running, so start from a clean slate
+            clear_ffmpeg_output()
+            clear_preview()
+        job["status"] = "Running"
+        job["start_time"] = time.perf_counter()
+        active_job_id = job["id"]
+        refresh_job_row(job)
+        running += 1
+
+        thread = threading.Thread(target=create_gif_thread, args=(job,))
+        thread.daemon = True
+        thread.start()
+
+    if running:
+        tick_job_timers()
+
+
+def tick_job_timers():
+    """Keep running jobs' elapsed times fresh in the job list."""
+    global job_timer_id
+    if job_timer_id:
+        root.after_cancel(job_timer_id)
+        job_timer_id = None
+    running = [job for job in jobs if job["status"] == "Running"]
+    for job in running:
+        refresh_job_row(job)
+    if running:
+        job_timer_id = root.after(1000, tick_job_timers)
+
+
+def cancel_selected_jobs():
+    """Cancel the selected jobs, terminating FFmpeg for running ones."""
+    for item in jobs_tree.selection():
+        job = jobs_by_id.get(int(item))
+        if job is None:
+            continue
+        if job["status"] == "Queued":
+            job["status"] = "Cancelled"
+            refresh_job_row(job)
+        elif job["status"] == "Running":
+            job["cancel"].cancel()
+
+
+def clear_finished_jobs():
+    """Remove finished, failed and cancelled jobs from the list."""
+    for job in list(jobs):
+        if job["status"] in ("Done", "Failed", "Cancelled"):
+            jobs.remove(job)
+            del jobs_by_id[job["id"]]
+            jobs_tree.delete(str(job["id"]))
 
 
 def create_gif():
+    """Validate the current settings and add a GIF build to the job queue."""
+    global next_job_id
+    files = list(selected_files)
     folder = folder_var.get()
-    extension = extension_var.get()
     framerate = framerate_var.get()
     scale = get_scale_string()
     output = output_var.get()
-
-    # Check FFmpeg availability
-    if not check_ffmpeg():
-        update_status("Error: FFmpeg not found. Please install FFmpeg.", is_error=True)
+    encode_mode = encode_mode_var.get()
+    use_cache = use_cache_var.get()
+    predecode = predecode_var.get()
+    frame_order = frame_order_var.get()
+    real_timing = real_timing_var.get()
+    dedupe = dedupe_var.get()
+    backend = backend_var.get()
+    palette_sample = palette_sample_var.get()
+    target_size = target_size_var.get().strip()
+    renditions = renditions_var.get()
+
+    # Check the encoder is available (FFmpeg, or Pillow and NumPy)
+    try:
+        get_encoder_backend(backend)
+    except ValueError as e:
+        update_status(f"Error: {e}", is_error=True)
         return
 
     # Validate inputs
@@ -450,30 +830,74 @@ def create_gif():
     if not output.endswith('.gif'):
         output += '.gif'
 
-    # Clear status and start
-    update_status("Starting...")
-
-    # Disable UI and run in thread
-    set_ui_state(False)
-    thread = threading.Thread(target=create_gif_thread, args=(folder, extension, framerate, scale, output))
-    thread.daemon = True
-    thread.start()
+    job = {
+        "id": next_job_id,
+        "files": files,
+        "folder": folder,
+        "framerate": framerate,
+        "scale": scale,
+        "output": output,
+        "encode_mode": encode_mode,
+        "backend": backend,
+        "palette_sample": palette_sample,
+        "target_bytes": int(float(target_size) * 1024 * 1024) if target_size else None,
+        "palette_sample_amount": int(palette_amount_var.get()) if palette_sample in ("stride", "random") else None,
+        "durations": None,
+        "frame_order": frame_order,
+        "real_timing": real_timing,
+        "use_cache": use_cache,
+        "predecode": predecode,
+        "frame_deltas": float(frame_deltas_tolerance_var.get()) if frame_deltas_var.get() else None,
+        "scratch_dir": scratch_dir_var.get().strip() or None,
+        "dedupe_threshold": float(dedupe_threshold_var.get()) if dedupe else None,
+        "renditions": parse_renditions(renditions_spec_var.get()) if renditions else None,
+        "status": "Queued",
+        "percent": 0,
+        "start_time": None,
+        "elapsed": None,
+        "cancel": CancelToken(),
+    }
+    next_job_id += 1
+    jobs.append(job)
+    jobs_by_id[job["id"]] = job
+    jobs_tree.insert("", "end", iid=str(job["id"]), values=format_job_row(job))
+
+    update_status(f"Queued job {job['id']}: {output}")
+    start_queued_jobs()
 
 
 # Create window
 root = tk.Tk()
 root.title("FFGIF Maker")
-root.geometry("800x500")
+root.geometry("800x1010")
 
 # Storage for selected files and GIF animation
 selected_files = []
-gif_frames = []
 gif_animation_id = None
-current_frame = 0
+current_photo = None
+preview_queue = queue.Queue(maxsize=PREVIEW_BUFFER_FRAMES)
+preview_stop_event = threading.Event()
+# Called once the GIF preview's first frame is shown, see load_gif_preview
+preview_shown_callback = None
+
+# Proxy preview of the selected images: frames, shown frame, playback
+proxy_sequence = None
+proxy_index = 0
+proxy_playing = False
+proxy_animation_id = None
+
+ffmpeg_log = []
+ffmpeg_log_queue = queue.Queue()
+
+# GIF build jobs, in the order they were queued
+jobs = []
+jobs_by_id = {}
+next_job_id = 1
+active_job_id = None
+job_timer_id = None
 
 # Variables
 folder_var = tk.StringVar()
-extension_var = tk.StringVar()
 files_label_var = tk.StringVar(value="No files selected")
 framerate_var = tk.StringVar(value="4")
 scale_mode_var = tk.StringVar(value="factor")
@@ -481,11 +905,31 @@ scale_factor_var = tk.StringVar(value="0.5")
 pixel_width_var = tk.StringVar(value="640")
 pixel_height_var = tk.StringVar(value="480")
 output_var = tk.StringVar(value="output.gif")
+scratch_dir_var = tk.StringVar(value="")
 progress_var = tk.DoubleVar(value=0)
+progress_info_var = tk.StringVar(value="")
 status_var = tk.StringVar(value="")
 show_ffmpeg_var = tk.BooleanVar(value=False)
+encode_mode_var = tk.StringVar(value="two_pass")
+available_backends = get_available_backends()
+backend_var = tk.StringVar(value=available_backends[0] if available_backends else "ffmpeg")
+use_cache_var = tk.BooleanVar(value=False)
+predecode_var = tk.BooleanVar(value=False)
+frame_order_var = tk.StringVar(value="name")
+real_timing_var = tk.BooleanVar(value=False)
+dedupe_var = tk.BooleanVar(value=False)
+palette_sample_var = tk.StringVar(value="all")
+target_size_var = tk.StringVar(value="")
+palette_amount_var = tk.StringVar(value="10")
+dedupe_threshold_var = tk.StringVar(value="1.0")
+frame_deltas_var = tk.BooleanVar(value=False)
+frame_deltas_tolerance_var = tk.StringVar(value="8")
+renditions_var = tk.BooleanVar(value=False)
+renditions_spec_var = tk.StringVar(value=DEFAULT_RENDITIONS)
 preview_info_var = tk.StringVar(value="")
 last_output_path_var = tk.StringVar(value="")
+max_jobs_var = tk.StringVar(value="1")
+run_breakdown_var = tk.StringVar(value="")
 
 # Layout
 row = 0
@@ -534,9 +978,79 @@ tk.Label(root, text="Output Name:").grid(row=row, column=0, sticky="e", padx=10,
 tk.Entry(root, textvariable=output_var, width=50).grid(row=row, column=1, sticky="w", padx=5, pady=10)
 row += 1
 
+# Scratch folder for temporary files (empty = RAM disk or system temp folder)
+tk.Label(root, text="Scratch Folder:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+tk.Entry(root, textvariable=scratch_dir_var, width=50).grid(row=row, column=1, sticky="w", padx=5, pady=10)
+tk.Button(root, text="Choose...", command=select_scratch_dir, width=15).grid(row=row, column=2, padx=10, pady=10)
+row += 1
+
+# Rendition ladder: several outputs from one decode
+tk.Label(root, text="Renditions:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+renditions_frame = tk.Frame(root)
+renditions_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+tk.Checkbutton(renditions_frame, text="Build several outputs in one pass:", variable=renditions_var).pack(side="left")
+tk.Entry(renditions_frame, textvariable=renditions_spec_var, width=30).pack(side="left", padx=5)
+tk.Label(renditions_frame, text="(format:scale, ...)").pack(side="left")
+row += 1
+
 # FFmpeg output toggle
 tk.Label(root, text="Options:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
-tk.Checkbutton(root, text="Show FFmpeg output", variable=show_ffmpeg_var, command=toggle_ffmpeg_output).grid(row=row, column=1, sticky="w", padx=5, pady=10)
+options_frame = tk.Frame(root)
+options_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+tk.Checkbutton(options_frame, text="Show FFmpeg output", variable=show_ffmpeg_var, command=toggle_ffmpeg_output).pack(side="left")
+tk.Checkbutton(options_frame, text="Cache scaled frames and palette", variable=use_cache_var).pack(side="left", padx=20)
+tk.Checkbutton(options_frame, text="Skip duplicate frames, threshold:", variable=dedupe_var).pack(side="left")
+tk.Entry(options_frame, textvariable=dedupe_threshold_var, width=5).pack(side="left")
+row += 1
+
+# Frame delta optimization (needs Pillow and NumPy)
+tk.Label(root, text="Frame Deltas:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+frame_deltas_frame = tk.Frame(root)
+frame_deltas_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+tk.Checkbutton(frame_deltas_frame, text="Store only changed pixels, tolerance:", variable=frame_deltas_var,
+               state="normal" if "pillow" in available_backends else "disabled").pack(side="left")
+tk.Entry(frame_deltas_frame, textvariable=frame_deltas_tolerance_var, width=5).pack(side="left")
+tk.Label(frame_deltas_frame, text="(0 = lossless)").pack(side="left", padx=5)
+row += 1
+
+# Encode mode selection
+tk.Label(root, text="Encode Mode:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+encode_mode_frame = tk.Frame(root)
+encode_mode_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+for mode_value, mode_label in ENCODE_MODES.items():
+    tk.Radiobutton(encode_mode_frame, text=mode_label, variable=encode_mode_var, value=mode_value).pack(side="left", padx=(0, 20))
+tk.Label(encode_mode_frame, text="Fit under (MB):").pack(side="left")
+tk.Entry(encode_mode_frame, textvariable=target_size_var, width=5).pack(side="left")
+row += 1
+
+# Palette frame sampling (FFmpeg encoder)
+tk.Label(root, text="Palette From:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+palette_frame = tk.Frame(root)
+palette_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+for method_value, method_label in PALETTE_SAMPLE_METHODS.items():
+    tk.Radiobutton(palette_frame, text=method_label, variable=palette_sample_var, value=method_value).pack(side="left", padx=(0, 15))
+tk.Label(palette_frame, text="N:").pack(side="left")
+tk.Entry(palette_frame, textvariable=palette_amount_var, width=5).pack(side="left")
+row += 1
+
+# Encoder backend selection (unavailable backends are greyed out)
+tk.Label(root, text="Encoder:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+backend_frame = tk.Frame(root)
+backend_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+for backend_value, backend_label in ENCODER_BACKENDS.items():
+    tk.Radiobutton(backend_frame, text=backend_label, variable=backend_var, value=backend_value,
+                   state="normal" if backend_value in available_backends else "disabled").pack(side="left", padx=(0, 20))
+tk.Checkbutton(backend_frame, text="Fast JPEG decode", variable=predecode_var,
+               state="normal" if HAS_PIL else "disabled").pack(side="left")
+row += 1
+
+# Frame order and timing
+tk.Label(root, text="Frame Order:").grid(row=row, column=0, sticky="e", padx=10, pady=10)
+frame_order_frame = tk.Frame(root)
+frame_order_frame.grid(row=row, column=1, columnspan=2, sticky="w", padx=5, pady=10)
+tk.Radiobutton(frame_order_frame, text="By name", variable=frame_order_var, value="name").pack(side="left", padx=(0, 20))
+tk.Radiobutton(frame_order_frame, text="By capture time", variable=frame_order_var, value="capture").pack(side="left", padx=(0, 20))
+tk.Checkbutton(frame_order_frame, text="Keep real time gaps", variable=real_timing_var).pack(side="left", padx=(0, 20))
 row += 1
 
 # Create button
@@ -549,6 +1063,10 @@ progress_bar = ttk.Progressbar(root, variable=progress_var, maximum=100, length=
 progress_bar.grid(row=row, column=1, pady=(0, 5))
 row += 1
 
+# Progress details: frames, throughput and ETA
+tk.Label(root, textvariable=progress_info_var, fg="#666666").grid(row=row, column=0, columnspan=3, pady=(0, 5))
+row += 1
+
 # Status label
 status_label = tk.Label(root, textvariable=status_var, wraplength=700, justify="left")
 status_label.grid(row=row, column=0, columnspan=3, padx=10, pady=(0, 5))
@@ -575,6 +1093,41 @@ preview_info_label.pack(anchor="w", pady=(0, 10))
 open_button = tk.Button(preview_right, text="Open GIF", command=open_gif, width=15, state="disabled")
 open_button.pack(anchor="w")
 
+# Play/pause and scrub the selected images before encoding
+sequence_controls = tk.Frame(preview_right)
+sequence_controls.pack(anchor="w", fill="x", pady=(10, 0))
+play_button = tk.Button(sequence_controls, text="Play", command=toggle_sequence_playback, width=6, state="disabled")
+play_button.pack(side="left")
+scrub_scale = tk.Scale(sequence_controls, from_=0, to=0, orient="horizontal", showvalue=False, length=300,
+                       command=scrub_sequence_preview, state="disabled")
+scrub_scale.pack(side="left", padx=5)
+
+row += 1
+
+# Job queue section
+jobs_frame = tk.LabelFrame(root, text="Jobs", padx=10, pady=5)
+jobs_frame.grid(row=row, column=0, columnspan=3, sticky="ew", padx=10, pady=5)
+
+jobs_controls = tk.Frame(jobs_frame)
+jobs_controls.pack(fill="x", pady=(0, 5))
+tk.Label(jobs_controls, text="Parallel jobs:").pack(side="left")
+tk.Spinbox(jobs_controls, from_=1, to=os.cpu_count() or 1, textvariable=max_jobs_var, width=4,
+           command=start_queued_jobs).pack(side="left", padx=5)
+tk.Button(jobs_controls, text="Clear Finished", command=clear_finished_jobs).pack(side="right")
+tk.Button(jobs_controls, text="Cancel Job", command=cancel_selected_jobs).pack(side="right", padx=5)
+
+jobs_columns = ("id", "output", "frames", "status", "progress", "time")
+jobs_tree = ttk.Treeview(jobs_frame, columns=jobs_columns, show="headings", height=4)
+for column, heading, width in zip(jobs_columns, ("#", "Output", "Frames", "Status", "Progress", "Time"),
+                                  (40, 360, 70, 90, 70, 70)):
+    jobs_tree.heading(column, text=heading)
+    jobs_tree.column(column, width=width, anchor="w" if column == "output" else "center")
+jobs_tree.pack(fill="x")
+
+# Where the last build's time went (every run is also appended to the run log)
+tk.Label(jobs_frame, textvariable=run_breakdown_var, anchor="w", justify="left", wraplength=740,
+         fg="#555555").pack(fill="x", pady=(5, 0))
+
 row += 1
 
 # Remember the row for FFmpeg output
@@ -582,11 +1135,17 @@ ffmpeg_row = row
 
 # FFmpeg output frame (hidden by default)
 ffmpeg_frame = tk.Frame(root)
-tk.Label(ffmpeg_frame, text="FFmpeg Output:").pack(anchor="w")
+ffmpeg_header = tk.Frame(ffmpeg_frame)
+ffmpeg_header.pack(side="top", fill="x")
+tk.Label(ffmpeg_header, text="FFmpeg Output:").pack(side="left")
+tk.Button(ffmpeg_header, text="Save Log...", command=save_ffmpeg_log).pack(side="right")
 ffmpeg_text = tk.Text(ffmpeg_frame, height=12, width=95, state="disabled", bg="#1e1e1e", fg="#ffffff", font=("Courier", 10))
 ffmpeg_scrollbar = tk.Scrollbar(ffmpeg_frame, command=ffmpeg_text.yview)
 ffmpeg_text.config(yscrollcommand=ffmpeg_scrollbar.set)
 ffmpeg_text.pack(side="left", fill="both", expand=True)
 ffmpeg_scrollbar.pack(side="right", fill="y")
 
+# Start draining queued FFmpeg output into the window
+root.after(LOG_PUMP_INTERVAL_MS, pump_ffmpeg_output)
+
 root.mainloop()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""Benchmark FFGIF Maker's encoder backends on the same frames.
+
+Builds the same GIF with each backend (and, for FFmpeg, each encode mode),
+times the app's preview decoder on it, and prints JSON with wall and CPU
+time, throughput, output size and peak memory to stdout. With --suite,
+runs on synthetic image sequences of varied sizes, counts, formats and
+color complexity instead, generated with FFmpeg on first use. Results can
+be saved and compared against a baseline to catch regressions. With
+--transport, also times handing Pillow-decoded frames to FFmpeg through
+the raw frame pipe against writing them to disk as intermediate images.
+
+Examples:
+    python ffgif_bench.py shoot1/
+    python ffgif_bench.py frames.txt --backends pillow --repeat 5 --scale 0.25
+    python ffgif_bench.py --suite --output baseline.json
+    python ffgif_bench.py --suite --baseline baseline.json
+    python ffgif_bench.py shoot1/ --transport
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from ffgif_cli import collect_input_files
+from ffgif_engine import (
+    ENCODE_MODES, ENCODER_BACKENDS, build_gif, find_ffmpeg, get_available_backends, get_cache_dir,
+    make_scale_string, run_ffmpeg
+)
+
+# Synthetic frame sources by color complexity (FFmpeg lavfi; deterministic)
+SUITE_SOURCES = {
+    "flat": "smptebars=size={size}:rate=10,hue=h=t*36",
+    "detailed": "testsrc2=size={size}:rate=10",
+    "noisy": "testsrc2=size={size}:rate=10,noise=alls=25:allf=t+u",
+}
+
+# Synthetic sequences for --suite: (complexity, size, frame count, image format)
+SUITE_CASES = [
+    ("flat", "320x240", 60, "png"),
+    ("noisy", "320x240", 60, "jpg"),
+    ("detailed", "320x240", 300, "jpg"),
+    ("detailed", "1280x720", 60, "jpg"),
+    ("detailed", "1920x1080", 30, "png"),
+    ("noisy", "1920x1080", 30, "jpg"),
+]
+
+# Slowdown or size growth over the baseline that counts as a regression
+REGRESSION_TOLERANCE = 0.10
+
+# Intermediate image formats the raw frame pipe is compared with
+TRANSPORT_DISK_FORMATS = ("png", "bmp")
+
+
+def get_case_name(case):
+    """Name a suite case, e.g. detailed_1280x720_60_jpg."""
+    complexity, size, frame_count, image_format = case
+    return f"{complexity}_{size}_{frame_count}_{image_format}"
+
+
+def generate_sequence(ffmpeg_bin, case, data_dir):
+    """Return the files of a synthetic suite sequence, generating them if missing."""
+    complexity, size, frame_count, image_format = case
+    folder = os.path.join(data_dir, get_case_name(case))
+    if os.path.isdir(folder):
+        files = collect_input_files(folder)
+        if len(files) == frame_count:
+            return files
+
+    # Generate into a private folder, then move it into place
+    work_dir = tempfile.mkdtemp(prefix=".tmp-", dir=data_dir)
+    try:
+        quality_args = ["-q:v", "3"] if image_format == "jpg" else []
+        subprocess.run([
+            ffmpeg_bin, "-v", "error", "-y", "-f", "lavfi", "-i", SUITE_SOURCES[complexity].format(size=size),
+            "-frames:v", str(frame_count), *quality_args, os.path.join(work_dir, f"frame_%04d.{image_format}")
+        ], check=True)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(work_dir, folder)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return collect_input_files(folder)
+
+
+def measure_preview(gif_path):
+    """Time one full pass of the app's preview decoder over gif_path, or None without Pillow."""
+    try:
+        from PIL import Image
+        from ffgif_decode import decode_preview_frames, get_preview_size
+    except ImportError:
+        return None
+    with Image.open(gif_path) as gif:
+        preview_size = get_preview_size(*gif.size)
+
+    # Frames are thrown away; stop once the first pass has counted them all
+    stop_event = threading.Event()
+    discard = types.SimpleNamespace(put=lambda item, timeout=None: None)
+    start = time.perf_counter()
+    decode_preview_frames(gif_path, preview_size, discard, stop_event, lambda count: stop_event.set())
+    return time.perf_counter() - start
+
+
+def benchmark(files, backend, encode_mode, framerate, scale, repeat, work_dir):
+    """Build the GIF repeat times and return median timings, output size and preview time."""
+    output_path = os.path.join(work_dir, f"{backend}_{encode_mode}.gif")
+    runs = []
+    cpu_times = []
+    for _ in range(repeat):
+        # User + system time of this process and its finished FFmpeg children
+        before = os.times()
+        runs.append(build_gif(files, output_path, framerate, scale, encode_mode, backend=backend))
+        after = os.times()
+        cpu_times.append(sum(after[:4]) - sum(before[:4]))
+    elapsed = statistics.median(run["elapsed"] for run in runs)
+    return {
+        "backend": backend,
+        "encode_mode": encode_mode if backend == "ffmpeg" else None,
+        "frames": runs[0]["frames"],
+        "bytes": runs[0]["bytes"],
+        "elapsed": elapsed,
+        "cpu_time": statistics.median(cpu_times),
+        "fps": runs[0]["frames"] / max(elapsed, 1e-6),
+        "peak_rss": max((run["peak_rss"] or 0) for run in runs) or None,
+        "preview": measure_preview(output_path),
+        "runs": [run["elapsed"] for run in runs],
+    }
+
+
+def measure_transport(ffmpeg_bin, files, scale, repeat, work_dir):
+    """Time getting Pillow-decoded frames into FFmpeg: through a FrameRing pipe, or via image files on disk.
+
+    Every method decodes the same frames in a thread pool and feeds them to
+    the same palettegen run. Returns one result per method with the median
+    time, or None without Pillow.
+    """
+    try:
+        from PIL import Image
+        from ffgif_decode import FrameRing, decode_image, fill_decoded_frame, parse_scale
+    except ImportError:
+        return None
+    with Image.open(files[0]) as first:
+        size = parse_scale(scale, *first.size)
+    palette_path = os.path.join(work_dir, "transport_palette.png")
+
+    def run_pipe():
+        ring = FrameRing(size)
+        run_ffmpeg([
+            ffmpeg_bin, "-y", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}",
+            "-framerate", "10", "-i", "pipe:0", "-vf", "palettegen", palette_path
+        ], "Transport: raw frame pipe", stdin_chunks=ring.frames(len(files), fill_decoded_frame(ring, files)))
+        return 0
+
+    def run_disk(image_format):
+        frames_dir = tempfile.mkdtemp(prefix="frames-", dir=work_dir)
+        try:
+            def save(index):
+                path = os.path.join(frames_dir, f"{index:06d}.{image_format}")
+                decode_image(files[index], size).save(path)
+                return os.path.getsize(path)
+
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+                written = sum(executor.map(save, range(len(files))))
+            run_ffmpeg([
+                ffmpeg_bin, "-y", "-framerate", "10", "-i", os.path.join(frames_dir, f"%06d.{image_format}"),
+                "-vf", "palettegen", palette_path
+            ], f"Transport: {image_format} files")
+            return written
+        finally:
+            shutil.rmtree(frames_dir, ignore_errors=True)
+
+    methods = [("pipe", run_pipe)] + [(f"disk_{image_format}", lambda image_format=image_format: run_disk(image_format))
+                                      for image_format in TRANSPORT_DISK_FORMATS]
+    results = []
+    for method, run in methods:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            written = run()
+            times.append(time.perf_counter() - start)
+        elapsed = statistics.median(times)
+        results.append({
+            "method": method,
+            "frames": len(files),
+            "size": f"{size[0]}x{size[1]}",
+            "elapsed": elapsed,
+            "fps": len(files) / max(elapsed, 1e-6),
+            "bytes_written": written,
+            "runs": times,
+        })
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List results slower or larger than the matching baseline result by more than tolerance."""
+    previous = {(result.get("case"), result["backend"], result["encode_mode"]): result
+                for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result.get("case"), result["backend"], result["encode_mode"]))
+        if old is None:
+            continue
+        for metric in ("elapsed", "bytes"):
+            if old.get(metric) and result[metric] > old[metric] * (1 + tolerance):
+                regressions.append({
+                    "case": result.get("case"),
+                    "backend": result["backend"],
+                    "encode_mode": result["encode_mode"],
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "value": result[metric],
+                    "change": result[metric] / old[metric] - 1,
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare encoder backends on one image sequence.")
+    parser.add_argument("input", nargs="?", help="image folder, or text file listing one image per line")
+    parser.add_argument("--suite", action="store_true",
+                        help="benchmark synthetic sequences of varied sizes, formats and complexity instead")
+    parser.add_argument("--cases", nargs="+", choices=[get_case_name(case) for case in SUITE_CASES],
+                        help="suite cases to run (default: all)")
+    parser.add_argument("--data-dir", help="folder for the generated suite sequences (default: in the cache)")
+    parser.add_argument("--backends", nargs="+", choices=list(ENCODER_BACKENDS),
+                        help="backends to compare (default: all available)")
+    parser.add_argument("--modes", nargs="+", choices=list(ENCODE_MODES), default=["two_pass"],
+                        help="FFmpeg encode modes to compare (default: two_pass)")
+    parser.add_argument("-r", "--framerate", default="4", help="frames per second (default: 4)")
+    parser.add_argument("--scale", type=float, default=0.5, help="scale factor (default: 0.5)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration; the median is kept (default: 3)")
+    parser.add_argument("--output", help="also write the JSON results to this file (e.g. to use as a baseline)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to check for regressions")
+    parser.add_argument("--transport", action="store_true",
+                        help="also compare piping decoded frames to FFmpeg with writing them to disk first")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="slowdown or size growth that counts as a regression (default: 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    if args.suite == bool(args.input):
+        parser.error("give either an input or --suite")
+    if args.repeat < 1:
+        parser.error("repeat must be at least 1")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.suite:
+        ffmpeg_bin = find_ffmpeg()
+        if ffmpeg_bin is None:
+            parser.error("the suite needs FFmpeg to generate its sequences")
+        data_dir = args.data_dir or os.path.join(get_cache_dir(), "bench")
+        os.makedirs(data_dir, exist_ok=True)
+        cases = [case for case in SUITE_CASES if not args.cases or get_case_name(case) in args.cases]
+        inputs = []
+        for case in cases:
+            print(f"Preparing {get_case_name(case)}...", file=sys.stderr)
+            inputs.append((get_case_name(case), generate_sequence(ffmpeg_bin, case, data_dir)))
+    else:
+        files = collect_input_files(args.input)
+        if not files:
+            parser.error(f"no image files found in {args.input}")
+        inputs = [(None, files)]
+    backends = args.backends or get_available_backends()
+    scale = make_scale_string(factor=args.scale)
+
+    work_dir = tempfile.mkdtemp(prefix="ffgif-bench-")
+    try:
+        results = []
+        transport = [] if args.transport else None
+        for case_name, files in inputs:
+            for backend in backends:
+                for encode_mode in args.modes if backend == "ffmpeg" else ["two_pass"]:
+                    print(f"{case_name or args.input}: {backend} {encode_mode}...", file=sys.stderr)
+                    result = benchmark(files, backend, encode_mode, args.framerate, scale, args.repeat, work_dir)
+                    if case_name:
+                        result = dict(case=case_name, **result)
+                    results.append(result)
+            if args.transport:
+                print(f"{case_name or args.input}: frame transport...", file=sys.stderr)
+                for result in measure_transport(find_ffmpeg(), files, scale, args.repeat, work_dir) or []:
+                    transport.append(dict(case=case_name, **result) if case_name else result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "input": args.input,
+        "suite": args.suite,
+        "frames": sum(len(files) for _, files in inputs),
+        "scale": scale,
+        "repeat": args.repeat,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if transport is not None:
+        report["transport"] = transport
+    if baseline is not None:
+        report["regressions"] = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['case'] or args.input} {regression['backend']} "
+                  f"{regression['encode_mode'] or ''}: {regression['metric']} {regression['change']:+.0%}",
+                  file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Command-line batch mode for FFGIF Maker.
+
+Builds one GIF per input folder or file list without the GUI and prints
+JSON results with timings to stdout.
+
+Examples:
+    python ffgif_cli.py shoot1/ shoot2/ shoot3/ --jobs 2
+    python ffgif_cli.py frames.txt --size 640x480 -r 10 -o out/
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ffgif_engine import (
+    DITHER_MODES, ENCODE_MODES, ENCODER_BACKENDS, IMAGE_EXTENSIONS, PALETTE_SAMPLE_METHODS, append_run_log, build_gif,
+    build_renditions, check_single_format, default_output_name, get_frame_times, get_gap_durations, ignore,
+    make_scale_string, parse_renditions, sort_by_capture_time
+)
+
+
+def collect_input_files(path):
+    """List the images for an input folder or file list, in order.
+
+    A file list has one image path per line, relative to the list's folder.
+    Blank lines and lines starting with # are skipped.
+    """
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        return [os.path.join(path, name) for name in names]
+
+    base = os.path.dirname(os.path.abspath(path))
+    files = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                files.append(os.path.join(base, line))
+    return files
+
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT argument."""
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError("width and height must be positive")
+    return width, height
+
+
+def parse_renditions_arg(value):
+    """Parse a --renditions argument."""
+    try:
+        return parse_renditions(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def plan_outputs(inputs, output_dir=None, single_format=False):
+    """Collect each input's files and pick an output path for it.
+
+    Returns a list of (input, files, output_path, error) tuples. Output
+    names that would clash within one run get a numeric suffix. With
+    single_format, inputs mixing image formats (which FFmpeg can't read as
+    one sequence) get an error.
+    """
+    planned = []
+    claimed = set()
+    for input_path in inputs:
+        try:
+            files = collect_input_files(input_path)
+        except OSError as e:
+            planned.append((input_path, [], None, str(e)))
+            continue
+        if not files:
+            planned.append((input_path, [], None, "No image files found"))
+            continue
+        if single_format:
+            try:
+                check_single_format(files)
+            except ValueError as e:
+                planned.append((input_path, [], None, str(e)))
+                continue
+
+        folder = output_dir or os.path.dirname(os.path.abspath(files[0]))
+        stem = os.path.splitext(default_output_name(files[0]))[0]
+        output_path = os.path.join(folder, f"{stem}.gif")
+        suffix = 2
+        while output_path in claimed:
+            output_path = os.path.join(folder, f"{stem}_{suffix}.gif")
+            suffix += 1
+        claimed.add(output_path)
+        planned.append((input_path, files, output_path, None))
+    return planned
+
+
+def run_job(job, args, scale):
+    """Build the GIF for one planned input and return its JSON result."""
+    input_path, files, output_path, error = job
+    result = {"input": input_path}
+    if error:
+        result["ok"] = False
+        result["error"] = error
+        return result
+
+    try:
+        log = sys.stderr.write if args.verbose else ignore
+        durations = None
+        if args.order == "capture":
+            files, frame_times = sort_by_capture_time(files)
+        elif args.real_timing:
+            frame_times = get_frame_times(files)
+        if args.real_timing:
+            durations = get_gap_durations(frame_times, args.framerate)
+        if args.renditions:
+            result.update(build_renditions(files, output_path, args.renditions, args.framerate, scale, durations,
+                                           work_dir=args.scratch_dir, log=log))
+            result["ok"] = True
+            return result
+        palette_scale = None
+        if args.palette_scale:
+            palette_scale = make_scale_string(factor=args.palette_scale)
+        target_bytes = None
+        if args.target_size:
+            target_bytes = int(args.target_size * 1024 * 1024)
+        result.update(build_gif(files, output_path, args.framerate, scale, args.mode, durations,
+                                use_cache=args.cache, log=log, dedupe_threshold=args.dedupe,
+                                backend=args.backend, palette_sample=args.palette_sample,
+                                palette_sample_amount=args.palette_amount, palette_scale=palette_scale,
+                                measure_palette=args.measure_palette, max_colors=args.colors,
+                                dither=args.dither, predecode=args.fast_decode, work_dir=args.scratch_dir,
+                                frame_deltas=args.frame_deltas, target_bytes=target_bytes))
+        result["ok"] = True
+    except subprocess.CalledProcessError as e:
+        result["ok"] = False
+        result["error"] = f"FFmpeg failed with exit code {e.returncode}"
+    except (OSError, ValueError) as e:
+        result["ok"] = False
+        result["error"] = str(e)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create GIFs from image sequences without the GUI.")
+    parser.add_argument("inputs", nargs="+",
+                        help="image folders, or text files listing one image per line")
+    parser.add_argument("-r", "--framerate", default="4", help="frames per second (default: 4)")
+    scale_group = parser.add_mutually_exclusive_group()
+    scale_group.add_argument("--scale", type=float, default=0.5,
+                             help="scale factor, e.g. 0.5 = half size (default: 0.5)")
+    scale_group.add_argument("--size", type=parse_size, help="exact output size as WIDTHxHEIGHT")
+    parser.add_argument("--mode", choices=list(ENCODE_MODES), default="two_pass",
+                        help="encode mode (default: two_pass)")
+    parser.add_argument("--backend", choices=list(ENCODER_BACKENDS), default="ffmpeg",
+                        help="encoder: ffmpeg, or pillow to build in-process without FFmpeg (default: ffmpeg)")
+    parser.add_argument("--colors", type=int, default=256, help="palette size, 2-256 (default: 256)")
+    parser.add_argument("--dither", choices=list(DITHER_MODES), default="floyd_steinberg",
+                        help="dither mode (default: floyd_steinberg)")
+    parser.add_argument("--target-size", type=float, metavar="MB",
+                        help="fit each GIF under this many MB by searching scale, frame rate, colors and "
+                             "dither with sample encodes (--scale/--size, --colors and --dither are the "
+                             "starting point)")
+    parser.add_argument("--renditions", type=parse_renditions_arg, metavar="SPEC",
+                        help="build several outputs from one decode instead of one GIF, e.g. "
+                             "\"gif:1, gif:0.5, webp:0.5, mp4:1\" (format:factor of the chosen scale)")
+    parser.add_argument("--palette-sample", choices=list(PALETTE_SAMPLE_METHODS), default="all",
+                        help="frames the palette is built from: all, auto (grows until the palette settles), "
+                             "stride (every Nth) or random (N frames) (default: all)")
+    parser.add_argument("--palette-amount", type=int, metavar="N",
+                        help="N for --palette-sample stride/random, or the starting sample for auto")
+    parser.add_argument("--palette-scale", type=float, metavar="FACTOR",
+                        help="shrink sampled frames further for the palette, e.g. 0.5")
+    parser.add_argument("--measure-palette", action="store_true",
+                        help="also build the full palette and report the sample's mean ΔE from it")
+    parser.add_argument("--order", choices=["name", "capture"], default="name",
+                        help="frame order: file name or EXIF capture time (default: name)")
+    parser.add_argument("--real-timing", action="store_true",
+                        help="keep the real time gaps between frames, scaled to the frame rate")
+    parser.add_argument("--dedupe", type=float, nargs="?", const=1.0, metavar="THRESHOLD",
+                        help="merge near-duplicate frames into the previous frame's duration; THRESHOLD "
+                             "is the mean pixel difference (0-255) to treat as duplicate (default: 1.0)")
+    parser.add_argument("--frame-deltas", type=float, nargs="?", const=8.0, metavar="TOLERANCE",
+                        help="store only the pixels that changed since the previous frame; pixels within "
+                             "TOLERANCE (0-255, 0 = lossless) count as unchanged (default: 8)")
+    parser.add_argument("--cache", action="store_true", help="cache scaled frames and palettes")
+    parser.add_argument("--fast-decode", action="store_true",
+                        help="decode JPEGs at a reduced size with Pillow and pipe them to FFmpeg "
+                             "(for scales of 0.5 or less)")
+    parser.add_argument("-o", "--output-dir", help="folder for the GIFs (default: next to the images)")
+    parser.add_argument("--scratch-dir", help="folder for temporary files (default: /dev/shm if it has room, "
+                                              "else the system temp folder)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="GIFs to build at once (default: 1)")
+    parser.add_argument("--run-log", nargs="?", const="", metavar="PATH",
+                        help="append each result, with stage spans, CPU, memory and I/O, to a JSONL run log "
+                             "(default PATH: runs.jsonl in the cache folder, shared with the app)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print FFmpeg output to stderr")
+    args = parser.parse_args(argv)
+
+    try:
+        if float(args.framerate) <= 0:
+            parser.error("frame rate must be a positive number")
+    except ValueError:
+        parser.error("frame rate must be a valid number")
+    if args.dedupe is not None and args.dedupe < 0:
+        parser.error("dedupe threshold must not be negative")
+    if args.frame_deltas is not None and not 0 <= args.frame_deltas <= 255:
+        parser.error("frame delta tolerance must be between 0 and 255")
+    if args.renditions and args.frame_deltas is not None:
+        parser.error("--frame-deltas doesn't apply to --renditions")
+    if args.renditions and args.dedupe is not None:
+        parser.error("--dedupe doesn't apply to --renditions")
+    if args.renditions and args.target_size is not None:
+        parser.error("--target-size doesn't apply to --renditions")
+    if not 2 <= args.colors <= 256:
+        parser.error("colors must be between 2 and 256")
+    if args.target_size is not None and args.target_size <= 0:
+        parser.error("target size must be positive")
+    if args.palette_amount is not None and args.palette_amount < 1:
+        parser.error("palette amount must be at least 1")
+    if args.palette_scale is not None and args.palette_scale <= 0:
+        parser.error("palette scale must be positive")
+    if args.renditions and args.backend != "ffmpeg":
+        parser.error("--renditions needs the ffmpeg backend")
+    if args.jobs < 1:
+        parser.error("jobs must be at least 1")
+    if args.size:
+        scale = make_scale_string(width=args.size[0], height=args.size[1])
+    else:
+        if args.scale <= 0:
+            parser.error("scale factor must be positive")
+        scale = make_scale_string(factor=args.scale)
+
+    if args.scratch_dir and not os.path.isdir(args.scratch_dir):
+        parser.error(f"scratch folder not found: {args.scratch_dir}")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        # FFmpeg reads the images unless the Pillow encoder builds the GIF on its own
+        single_format = args.backend == "ffmpeg" or args.dedupe is not None
+        jobs = plan_outputs(args.inputs, args.output_dir, single_format)
+        results = list(executor.map(lambda job: run_job(job, args, scale), jobs))
+
+    if args.run_log is not None:
+        finished = time.time()
+        for result in results:
+            append_run_log(dict(time=finished, framerate=args.framerate, scale=scale, **result), args.run_log or None)
+
+    print(json.dumps({
+        "jobs": args.jobs,
+        "elapsed": time.perf_counter() - start_time,
+        "results": results,
+    }, indent=2))
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""Pillow image decoding for FFGIF Maker: reduced-size JPEGs and GIF previews.
+
+FFmpeg decodes every JPEG at full size before scaling it down. For big
+downscales, Pillow can instead decode straight at (close to) the output
+size through libjpeg's DCT scaling (Image.draft), which skips most of the
+decode work. The frames are resized to the exact output size in a thread
+pool and streamed to FFmpeg as raw RGB over its stdin, through a FrameRing:
+a few preallocated frame buffers that any Python frame stage can fill
+instead of writing intermediate images to disk.
+
+The app's previews are decoded here too, so they can run (and be
+benchmarked) without a window: the finished GIF, and proxy frames of the
+selected images for playing and scrubbing the sequence before encoding.
+"""
+
+import io
+import itertools
+import mmap
+import os
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import ExifTags, Image
+
+from ffgif_engine import evict_cache, get_cache_dir, get_frame_cache_key, touch_cache_entry
+
+# Frame buffers in a FrameRing, per worker thread: frames prepared ahead of FFmpeg
+DECODE_FRAMES_IN_FLIGHT = 4
+
+# JPEG DCT scaling only pays off from a 1/2 reduction on
+MIN_DRAFT_REDUCTION = 2
+
+# Longest side of the preview in the app
+PREVIEW_MAX_SIZE = 250
+
+# JPEG quality of cached proxy frames
+PROXY_QUALITY = 80
+
+# EXIF IFD1 tags locating the embedded JPEG thumbnail
+EXIF_THUMBNAIL_OFFSET = 0x0201
+EXIF_THUMBNAIL_LENGTH = 0x0202
+
+# A scale term: iw or ih, optionally multiplied or divided by a number, or a plain number
+SCALE_TERM = re.compile(r"^\s*(?:(iw|ih)\s*(?:([*/])\s*(\d+(?:\.\d*)?))?|(-?\d+(?:\.\d*)?))\s*$")
+
+
+def parse_scale(scale, width, height):
+    """Evaluate an FFmpeg scale string like "iw*0.5:ih*0.5" or "640:480" for an image size.
+
+    Supports the forms make_scale_string produces, plus -1/-2 to keep the
+    aspect ratio like FFmpeg. Raises ValueError for anything else.
+    """
+    parts = scale.split(":")
+    if len(parts) != 2:
+        raise ValueError(f"Unsupported scale: {scale}")
+
+    sizes = []
+    for part in parts:
+        match = SCALE_TERM.match(part)
+        if not match:
+            raise ValueError(f"Unsupported scale: {scale}")
+        name, op, operand, number = match.groups()
+        if number is not None:
+            sizes.append(float(number))
+            continue
+        value = width if name == "iw" else height
+        if op == "*":
+            value *= float(operand)
+        elif op == "/":
+            value /= float(operand)
+        sizes.append(value)
+
+    out_width, out_height = sizes
+    if out_width < 0 and out_height < 0:
+        return width, height
+    if out_width < 0:
+        out_width = out_height * width / height
+        if sizes[0] == -2:
+            out_width = 2 * round(out_width / 2)
+    elif out_height < 0:
+        out_height = out_width * height / width
+        if sizes[1] == -2:
+            out_height = 2 * round(out_height / 2)
+    return max(1, int(out_width)), max(1, int(out_height))
+
+
+def get_draft_size(files, scale):
+    """Return the output size if files are JPEGs that can be decoded at a reduced size, else None.
+
+    Like FFmpeg with -reinit_filter 0, every frame gets the first frame's
+    output size.
+    """
+    if not all(path.lower().endswith((".jpg", ".jpeg")) for path in files):
+        return None
+    with Image.open(files[0]) as first:
+        try:
+            size = parse_scale(scale, *first.size)
+        except ValueError:
+            return None
+        reduction = min(first.size[0] // size[0], first.size[1] // size[1])
+    return size if reduction >= MIN_DRAFT_REDUCTION else None
+
+
+def decode_image(filepath, size):
+    """Decode an image at the smallest JPEG DCT scale covering size, then resize it to size as RGB."""
+    with Image.open(filepath) as image:
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.BICUBIC)
+        return image
+
+
+class FrameRing:
+    """Preallocated RGB frame buffers between a Python frame stage and FFmpeg's stdin.
+
+    The buffers are allocated once, in one anonymous shared memory map,
+    and reused for every frame: fill(index, slot) is called on worker
+    threads to write frame index into buffers[slot] (a writable memoryview)
+    or arrays[slot] (the same memory as a (height, width, 3) NumPy array,
+    when NumPy is installed). frames() yields the filled buffers in order,
+    for run_ffmpeg's stdin_chunks with "-f rawvideo -pix_fmt rgb24". A
+    buffer is only refilled after FFmpeg's stdin has taken it, so the stage
+    never runs more than len(buffers) frames ahead, and memory use doesn't
+    grow with the number of frames.
+    """
+
+    def __init__(self, size, slots=None, workers=None):
+        self.size = size
+        self.workers = workers or os.cpu_count() or 1
+        slots = slots or DECODE_FRAMES_IN_FLIGHT * self.workers
+        width, height = size
+        frame_bytes = width * height * 3
+        self.memory = mmap.mmap(-1, frame_bytes * slots)
+        view = memoryview(self.memory)
+        self.buffers = [view[i * frame_bytes:(i + 1) * frame_bytes] for i in range(slots)]
+        try:
+            import numpy as np
+        except ImportError:
+            self.arrays = None
+        else:
+            self.arrays = list(np.frombuffer(self.memory, dtype=np.uint8).reshape(slots, height, width, 3))
+
+    def frames(self, count, fill):
+        """Fill and yield frames 0 to count - 1, in order, each as one of the buffers."""
+        slots = len(self.buffers)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            upcoming = iter(range(count))
+            try:
+                for index in itertools.islice(upcoming, slots):
+                    pending.append((index, executor.submit(fill, index, index % slots)))
+                while pending:
+                    index, future = pending.popleft()
+                    future.result()
+                    yield self.buffers[index % slots]
+                    # FFmpeg has taken the frame; its buffer is free for the next one
+                    for upcoming_index in itertools.islice(upcoming, 1):
+                        pending.append((upcoming_index, executor.submit(fill, upcoming_index, index % slots)))
+            finally:
+                # Stopped early (error or cancel): drop frames not yet filled
+                for _, future in pending:
+                    future.cancel()
+
+
+def fill_decoded_frame(ring, files):
+    """Return a FrameRing fill function that decodes files (see decode_image) into its buffers."""
+    def fill(index, slot):
+        # Pillow keeps RGB padded to four bytes, so tobytes() packs it once before the copy in
+        ring.buffers[slot][:] = decode_image(files[index], ring.size).tobytes()
+    return fill
+
+
+def get_preview_size(width, height):
+    """Fit a GIF's size within PREVIEW_MAX_SIZE, never enlarging it."""
+    scale = min(PREVIEW_MAX_SIZE / width, PREVIEW_MAX_SIZE / height, 1.0)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decode_preview_frames(gif_path, preview_size, frame_queue, stop_event, on_frame_count):
+    """Decode and resize GIF frames into frame_queue, looping until stopped.
+
+    Runs on a background thread. The queue is bounded, so decoding stays a
+    few frames ahead of playback and memory does not grow with frame count.
+    on_frame_count is called once the first pass reaches the end.
+    """
+    with Image.open(gif_path) as gif:
+        index = 0
+        counted = False
+        while not stop_event.is_set():
+            try:
+                gif.seek(index)
+            except EOFError:
+                if not counted:
+                    on_frame_count(index)
+                    counted = True
+                if index == 0:
+                    return
+                index = 0
+                continue
+
+            frame = gif.convert("RGBA").resize(preview_size, Image.Resampling.LANCZOS)
+            duration = gif.info.get("duration") or 100
+            while not stop_event.is_set():
+                try:
+                    frame_queue.put((frame, duration), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            index += 1
+
+
+def read_exif_thumbnail(image):
+    """Return the JPEG thumbnail embedded in an opened image's EXIF data, or None."""
+    exif = image.info.get("exif")
+    if not exif or not exif.startswith(b"Exif\0\0"):
+        return None
+    ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    offset = ifd1.get(EXIF_THUMBNAIL_OFFSET)
+    length = ifd1.get(EXIF_THUMBNAIL_LENGTH)
+    if not offset or not length:
+        return None
+    # Offsets count from the TIFF header, after the "Exif\0\0" prefix
+    data = exif[6 + offset:6 + offset + length]
+    return data if data[:2] == b"\xff\xd8" else None
+
+
+def make_proxy_frame(filepath):
+    """Return a small JPEG of filepath fitted within PREVIEW_MAX_SIZE.
+
+    Uses the embedded EXIF thumbnail when it is at least half the proxy's
+    width, otherwise decodes the image at a reduced size (JPEG draft mode).
+    """
+    with Image.open(filepath) as image:
+        size = get_preview_size(*image.size)
+        thumbnail = read_exif_thumbnail(image)
+        frame = None
+        if thumbnail:
+            with Image.open(io.BytesIO(thumbnail)) as thumb:
+                if thumb.width * 2 >= size[0]:
+                    frame = thumb.convert("RGB").resize(size, Image.Resampling.BILINEAR)
+        if frame is None:
+            image.draft("RGB", size)
+            frame = image.convert("RGB").resize(size, Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    frame.save(buffer, format="JPEG", quality=PROXY_QUALITY)
+    return buffer.getvalue()
+
+
+def load_proxy_frame(filepath, cache_dir):
+    """Return filepath's proxy frame from the cache, making and caching it if missing."""
+    key = get_frame_cache_key(filepath, f"proxy{PREVIEW_MAX_SIZE}")
+    cached = os.path.join(cache_dir, f"{key}.jpg")
+    try:
+        with open(cached, "rb") as f:
+            data = f.read()
+        touch_cache_entry(cached)
+        return data
+    except OSError:
+        pass
+
+    data = make_proxy_frame(filepath)
+    # Write to a private name, then move into place so readers never see partial files
+    temp_path = f"{cached}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, cached)
+    except OSError:
+        pass
+    return data
+
+
+class ProxySequence:
+    """Proxy frames of an image sequence, loaded by background threads.
+
+    Workers load frames in order from the current position (see seek), so
+    playback and scrubbing get the frames they need first, and wrap around
+    until every frame is loaded. Frames are small JPEGs (see
+    load_proxy_frame); a frame that fails to load is b"". Once the workers
+    finish, the cache is trimmed (see evict_cache).
+    """
+
+    def __init__(self, files, workers=None):
+        self.files = list(files)
+        self.frames = [None] * len(self.files)
+        self.claimed = [False] * len(self.files)
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.cache_dir = os.path.join(get_cache_dir(), "proxies")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.running = workers or os.cpu_count() or 1
+        for _ in range(self.running):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+
+    def seek(self, index):
+        """Load frames from index onwards next."""
+        with self.lock:
+            self.cursor = index
+
+    def get(self, index):
+        """Return frame index if loaded, else None."""
+        return self.frames[index]
+
+    def loaded_count(self):
+        """Count the frames loaded so far."""
+        return sum(frame is not None for frame in self.frames)
+
+    def close(self):
+        """Stop loading frames."""
+        self.stop_event.set()
+
+    def _claim_next(self):
+        with self.lock:
+            for _ in range(2):
+                # Scan from the cursor to the end, then once more from the start
+                while self.cursor < len(self.files) and self.claimed[self.cursor]:
+                    self.cursor += 1
+                if self.cursor < len(self.files):
+                    self.claimed[self.cursor] = True
+                    return self.cursor
+                self.cursor = 0
+            return None
+
+    def _work(self):
+        try:
+            while not self.stop_event.is_set():
+                index = self._claim_next()
+                if index is None:
+                    return
+                try:
+                    self.frames[index] = load_proxy_frame(self.files[index], self.cache_dir)
+                except Exception:
+                    # Any image Pillow can't load (including decompression bombs) shows as missing
+                    self.frames[index] = b""
+        finally:
+            with self.lock:
+                self.running -= 1
+                last = self.running == 0
+            if last:
+                # Proxies are written without a build, so keep the cache within its limit here too
+                evict_cache(get_cache_dir())
@@ -0,0 +1,2178 @@
+#!/usr/bin/env python3
+"""GIF building pipeline shared by the FFGIF Maker app and command line.
+
+Uses only the standard library and the FFmpeg binary, so it can be
+imported without tkinter or PIL (e.g. on render servers).
+"""
+
+import atexit
+import subprocess
+import os
+import sys
+import threading
+import shutil
+import time
+import hashlib
+import io
+import json
+import operator
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# Encode modes: value -> label shown in the UI
+ENCODE_MODES = {
+    "two_pass": "Two pass",
+    "single_pass": "Single pass (decode once, more memory)",
+    "parallel": "Parallel chunks",
+}
+
+# Encoder backends: value -> label shown in the UI
+ENCODER_BACKENDS = {
+    "ffmpeg": "FFmpeg",
+    "pillow": "Pillow + NumPy (no FFmpeg)",
+}
+
+# Image extensions picked up when a folder is given as input
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif")
+
+# Image format of each extension; FFmpeg reads one format per sequence
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".bmp": "BMP", ".tiff": "TIFF", ".tif": "TIFF"}
+
+# Cache of scaled frames and palettes, trimmed least-recently-used first
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Side of the grayscale thumbnails compared to find near-duplicate frames
+DEDUPE_SIGNATURE_SIZE = 16
+
+# Frames compared with the last kept frame at once when NumPy is installed;
+# the block doubles up to the maximum while no frame has changed
+DEDUPE_COMPARE_BLOCK = 4
+DEDUPE_COMPARE_BLOCK_MAX = 1024
+
+# Folders tried first for builds' temporary files (RAM-backed, so they don't
+# compete with reads from the source folder), and the free space they need
+SCRATCH_CANDIDATES = ["/dev/shm"]
+SCRATCH_MIN_FREE_BYTES = 512 * 1024 * 1024
+
+# Rendition output formats: value -> (label shown in the UI, file extension)
+RENDITION_FORMATS = {
+    "gif": ("GIF", ".gif"),
+    "webp": ("Animated WebP", ".webp"),
+    "mp4": ("MP4 (H.264)", ".mp4"),
+}
+
+# Default rendition ladder, as accepted by parse_renditions
+DEFAULT_RENDITIONS = "gif:1, gif:0.5, gif:0.25, mp4:1"
+
+# paletteuse dither modes: value -> label shown in the UI
+DITHER_MODES = {
+    "floyd_steinberg": "Floyd-Steinberg",
+    "bayer:bayer_scale=3": "Bayer (compresses better)",
+    "none": "None",
+}
+
+# Settings the target-size search may trade for a smaller GIF, best quality
+# first: (frame step, palette colors, dither). Each gets its own scale.
+TARGET_SIZE_STEPS = [
+    (1, 256, "floyd_steinberg"),
+    (1, 256, "bayer:bayer_scale=3"),
+    (1, 128, "bayer:bayer_scale=3"),
+    (2, 128, "bayer:bayer_scale=3"),
+    (2, 64, "bayer:bayer_scale=2"),
+    (3, 64, "none"),
+]
+
+# The search prefers a later step over shrinking below this fraction of the
+# requested size, and aims this far under the budget to absorb estimate error
+TARGET_MIN_SCALE = 0.5
+TARGET_SIZE_MARGIN = 0.92
+
+# Size estimates encode this many clips of consecutive frames
+TARGET_SAMPLE_CLIPS = 3
+TARGET_CLIP_FRAMES = 8
+
+# How the palette's frames are chosen: value -> label shown in the UI
+PALETTE_SAMPLE_METHODS = {
+    "all": "All frames",
+    "auto": "Adaptive sample",
+    "stride": "Every Nth frame",
+    "random": "Random frames",
+}
+
+# Adaptive palette sampling starts with this many frames, doubling the
+# sample until the palette changes by no more than this mean ΔE
+PALETTE_AUTO_START_FRAMES = 24
+PALETTE_AUTO_TOLERANCE = 2.0
+
+# Longest frame, in normal frame durations, when keeping real time gaps
+MAX_GAP_FACTOR = 10
+
+
+def ignore(*args):
+    """Default callback that discards its arguments."""
+
+
+class BuildCancelled(Exception):
+    """Raised by build_gif when its CancelToken was cancelled."""
+
+
+class CancelToken:
+    """Lets another thread cancel a build by terminating its FFmpeg processes.
+
+    Also totals the resource usage of the build's finished FFmpeg processes
+    (see record_usage).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes = set()
+        self.cancelled = False
+        self.usage = {"processes": 0, "cpu_time": 0.0, "peak_rss": None, "bytes_read": None,
+                      "bytes_written": None}
+
+    def cancel(self):
+        """Cancel the build and terminate any FFmpeg process it is running."""
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            process.terminate()
+
+    def register(self, process):
+        """Track a running process, terminating it at once if already cancelled."""
+        with self._lock:
+            self._processes.add(process)
+            if self.cancelled:
+                process.terminate()
+
+    def unregister(self, process):
+        """Stop tracking a finished process."""
+        with self._lock:
+            self._processes.discard(process)
+
+    def check(self):
+        """Raise BuildCancelled if the build was cancelled."""
+        if self.cancelled:
+            raise BuildCancelled()
+
+    def record_usage(self, rusage, io_counters=None, peak_rss=None):
+        """Add a finished process's usage (from os.wait4), I/O counters (see read_process_io) and peak memory.
+
+        Without peak_rss, the peak comes from rusage, which on Linux also
+        counts this process's memory when the child was started.
+        """
+        # ru_maxrss is in kilobytes, except on macOS
+        peak = peak_rss or (rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024)
+        with self._lock:
+            usage = self.usage
+            usage["processes"] += 1
+            usage["cpu_time"] += rusage.ru_utime + rusage.ru_stime
+            usage["peak_rss"] = max(usage["peak_rss"] or 0, peak)
+            if io_counters is not None:
+                usage["bytes_read"] = (usage["bytes_read"] or 0) + io_counters["read"]
+                usage["bytes_written"] = (usage["bytes_written"] or 0) + io_counters["written"]
+
+    def get_usage(self):
+        """Return a copy of the FFmpeg usage totals so far."""
+        with self._lock:
+            return dict(self.usage)
+
+
+def get_rss():
+    """Get this process's current resident memory in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # No /proc (e.g. macOS): fall back to the lifetime peak, in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def read_process_io(pid="self"):
+    """Get the bytes a process has read and written, or None if unknown.
+
+    Counts every read and write, including pipes and files served from
+    the page cache. Linux only.
+    """
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            fields = dict(line.split(": ", 1) for line in f.read().splitlines() if ": " in line)
+        return {"read": int(fields["rchar"]), "written": int(fields["wchar"])}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_process_peak_rss(pid):
+    """Get a running process's peak resident memory in bytes, or None if unknown. Linux only."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class UsageMeter:
+    """Measures this process's CPU time and I/O from creation to read().
+
+    Like PeakMemoryMonitor, the figures cover the whole process, so they
+    include other builds running at the same time.
+    """
+
+    def __init__(self):
+        self.start_cpu = sum(os.times()[:2])
+        self.start_io = read_process_io()
+
+    def read(self):
+        """Return the CPU time and bytes read and written so far; bytes are None if unknown."""
+        now = read_process_io()
+        known = now is not None and self.start_io is not None
+        return {
+            "cpu_time": sum(os.times()[:2]) - self.start_cpu,
+            "bytes_read": now["read"] - self.start_io["read"] if known else None,
+            "bytes_written": now["written"] - self.start_io["written"] if known else None,
+        }
+
+
+class StageTimings(dict):
+    """Step durations in seconds by name, also kept as spans in order.
+
+    Setting a step's duration when it ends records its span: when it
+    started and how long it took, relative to start (a perf_counter time).
+    """
+
+    def __init__(self, start):
+        super().__init__()
+        self.start = start
+        self.spans = []
+
+    def __setitem__(self, name, duration):
+        super().__setitem__(name, duration)
+        end = time.perf_counter() - self.start
+        self.spans.append({"name": name, "start": max(0.0, end - duration), "duration": duration})
+
+
+def get_run_log_path():
+    """Get the path of the build run log (one JSON record per line)."""
+    return os.path.join(get_cache_dir(), "runs.jsonl")
+
+
+def append_run_log(record, path=None):
+    """Append one build's record to the run log as a line of JSON."""
+    path = path or get_run_log_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # One write per record, so builds finishing together don't interleave lines
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+class PeakMemoryMonitor:
+    """Samples this process's resident memory on a helper thread and keeps the peak.
+
+    Call start() and stop() around one build. The figure covers the whole
+    process, so it includes other builds running at the same time.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = get_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = get_rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def start(self):
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and take a last sample; safe to call more than once."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        rss = get_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+def find_ffmpeg():
+    """Find FFmpeg binary, checking common locations."""
+    # Check PATH first
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        return ffmpeg
+
+    # Check common macOS locations
+    common_paths = [
+        "/opt/homebrew/bin/ffmpeg",  # Apple Silicon Homebrew
+        "/usr/local/bin/ffmpeg",      # Intel Homebrew
+        "/usr/bin/ffmpeg",            # System
+    ]
+    for path in common_paths:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+
+    return None
+
+
+def check_ffmpeg():
+    """Check if FFmpeg is available."""
+    return find_ffmpeg() is not None
+
+
+# EXIF tags read for capture times
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATE_TIME_ORIGINAL = 0x9003
+EXIF_SUB_SEC_TIME_ORIGINAL = 0x9291
+
+# Capture times memoized by path, keyed on (mtime_ns, size)
+capture_time_memo = {}
+capture_time_lock = threading.Lock()
+
+
+def parse_exif_datetime(date_str, subsec=""):
+    """Parse an EXIF date like "2026:01:04 12:30:45" into a datetime, or None."""
+    try:
+        date = datetime.strptime(date_str.strip()[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    digits = "".join(ch for ch in subsec if ch.isdigit())[:6]
+    if digits:
+        date = date.replace(microsecond=int(digits.ljust(6, "0")))
+    return date
+
+
+def read_tiff_ifd(f, base, offset, byte_order, wanted):
+    """Read the wanted ASCII/LONG tags of one TIFF IFD into a dict."""
+    f.seek(base + offset)
+    count_bytes = f.read(2)
+    if len(count_bytes) < 2:
+        return {}
+    values = {}
+    for _ in range(int.from_bytes(count_bytes, byte_order)):
+        entry = f.read(12)
+        if len(entry) < 12:
+            break
+        tag = int.from_bytes(entry[0:2], byte_order)
+        if tag not in wanted:
+            continue
+        value_type = int.from_bytes(entry[2:4], byte_order)
+        count = int.from_bytes(entry[4:8], byte_order)
+        if value_type == 4:  # LONG, e.g. the Exif IFD pointer
+            values[tag] = int.from_bytes(entry[8:12], byte_order)
+        elif value_type == 2:  # ASCII, stored inline when it fits in 4 bytes
+            if count <= 4:
+                data = entry[8:8 + count]
+            else:
+                position = f.tell()
+                f.seek(base + int.from_bytes(entry[8:12], byte_order))
+                data = f.read(min(count, 64))
+                f.seek(position)
+            values[tag] = data.split(b"\0", 1)[0].decode("ascii", "replace")
+    return values
+
+
+def read_tiff_capture_time(f, base=0):
+    """Read DateTimeOriginal from TIFF-structured EXIF data starting at base."""
+    f.seek(base)
+    header = f.read(8)
+    if header[:4] == b"II*\0":
+        byte_order = "little"
+    elif header[:4] == b"MM\0*":
+        byte_order = "big"
+    else:
+        return None
+
+    ifd0 = read_tiff_ifd(f, base, int.from_bytes(header[4:8], byte_order), byte_order, {EXIF_IFD_POINTER})
+    if EXIF_IFD_POINTER not in ifd0:
+        return None
+    exif = read_tiff_ifd(f, base, ifd0[EXIF_IFD_POINTER], byte_order,
+                         {EXIF_DATE_TIME_ORIGINAL, EXIF_SUB_SEC_TIME_ORIGINAL})
+    if EXIF_DATE_TIME_ORIGINAL not in exif:
+        return None
+    return parse_exif_datetime(exif[EXIF_DATE_TIME_ORIGINAL], exif.get(EXIF_SUB_SEC_TIME_ORIGINAL, ""))
+
+
+def read_jpeg_capture_time(f):
+    """Find the EXIF APP1 segment of a JPEG and read DateTimeOriginal from it."""
+    if f.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD9, 0xDA):  # End of image or start of scan: no EXIF
+            return None
+        length = int.from_bytes(f.read(2), "big")
+        if length < 2:
+            return None
+        if marker[1] == 0xE1:
+            segment_start = f.tell()
+            if f.read(6) == b"Exif\0\0":
+                return read_tiff_capture_time(f, segment_start + 6)
+            f.seek(segment_start)
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_capture_time(filepath):
+    """Read the EXIF capture time of a JPEG or TIFF in-process.
+
+    Returns a datetime, or None when the file has no readable date or is in
+    a format this reader does not handle.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            head = f.read(4)
+            f.seek(0)
+            if head[:2] == b"\xff\xd8":
+                return read_jpeg_capture_time(f)
+            if head in (b"II*\0", b"MM\0*"):
+                return read_tiff_capture_time(f)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ExifToolSession:
+    """A persistent `exiftool -stay_open` process for formats read_capture_time can't parse."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = None
+
+    def read_capture_times(self, filepaths):
+        """Return DateTimeOriginal for each file (None where missing), in one exiftool call."""
+        if not filepaths:
+            return []
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                exiftool = shutil.which("exiftool")
+                if not exiftool:
+                    return [None] * len(filepaths)
+                self._process = subprocess.Popen(
+                    [exiftool, "-stay_open", "True", "-@", "-"],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                    text=True, encoding="utf-8"
+                )
+
+            # -T prints one tab-separated line per file it could read, "-" for missing tags
+            abspaths = [os.path.abspath(path) for path in filepaths]
+            args = ["-T", "-fast", "-FilePath", "-DateTimeOriginal", "-SubSecTimeOriginal", *abspaths, "-execute"]
+            self._process.stdin.write("\n".join(args) + "\n")
+            self._process.stdin.flush()
+            lines = []
+            for line in self._process.stdout:
+                if line.strip() == "{ready}":
+                    break
+                lines.append(line.rstrip("\n"))
+
+        # Files exiftool skips or fails on print no line, so match lines to files by path
+        indexes = {}
+        for i, path in enumerate(abspaths):
+            indexes.setdefault(path, []).append(i)
+            indexes.setdefault(os.path.realpath(path), []).append(i)
+        dates = [None] * len(filepaths)
+        for line in lines:
+            fields = line.split("\t") + ["-", "-"]
+            path, date_str, subsec = fields[0], fields[1], fields[2] if fields[2] != "-" else ""
+            if date_str == "-":
+                continue
+            for i in indexes.get(path) or indexes.get(os.path.realpath(path), []):
+                dates[i] = parse_exif_datetime(date_str, subsec)
+        return dates
+
+    def close(self):
+        """Ask exiftool to exit."""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                try:
+                    self._process.stdin.write("-stay_open\nFalse\n")
+                    self._process.stdin.flush()
+                    self._process.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._process.kill()
+            self._process = None
+
+
+exiftool_session = ExifToolSession()
+atexit.register(exiftool_session.close)
+
+
+def get_capture_times(filepaths):
+    """Return the EXIF capture time (or None) for each file, memoized by path and mtime.
+
+    JPEG and TIFF files are read in-process; other formats go to a single
+    persistent exiftool process in one batch, if exiftool is installed.
+    """
+    results = [None] * len(filepaths)
+    stamps = [None] * len(filepaths)
+    to_exiftool = []
+
+    for i, filepath in enumerate(filepaths):
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            continue
+        stamps[i] = (stat.st_mtime_ns, stat.st_size)
+        with capture_time_lock:
+            memo = capture_time_memo.get(filepath)
+        if memo is not None and memo[0] == stamps[i]:
+            results[i] = memo[1]
+            continue
+
+        results[i] = read_capture_time(filepath)
+        if results[i] is None and not filepath.lower().endswith((".jpg", ".jpeg", ".tif", ".tiff")):
+            to_exiftool.append(i)
+        else:
+            with capture_time_lock:
+                capture_time_memo[filepath] = (stamps[i], results[i])
+
+    if to_exiftool:
+        try:
+            dates = exiftool_session.read_capture_times([filepaths[i] for i in to_exiftool])
+        except (OSError, ValueError):
+            dates = [None] * len(to_exiftool)
+        with capture_time_lock:
+            for i, date in zip(to_exiftool, dates):
+                results[i] = date
+                capture_time_memo[filepaths[i]] = (stamps[i], date)
+
+    return results
+
+
+def get_image_date(filepath):
+    """Get image creation date from EXIF or file metadata."""
+    capture_time = get_capture_times([filepath])[0]
+    if capture_time is not None:
+        return capture_time.strftime("%Y%m%d")
+
+    # Fall back to file modification time
+    try:
+        mtime = os.path.getmtime(filepath)
+        return datetime.fromtimestamp(mtime).strftime("%Y%m%d")
+    except Exception:
+        return datetime.now().strftime("%Y%m%d")
+
+
+def format_file_size(size_bytes):
+    """Format file size in human readable format."""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    else:
+        return f"{size_bytes / (1024 * 1024):.2f} MB"
+
+
+def make_scale_string(factor=None, width=None, height=None):
+    """Build an FFmpeg scale string from a factor or pixel dimensions."""
+    if factor is not None:
+        return f"iw*{float(factor)}:ih*{float(factor)}"
+    return f"{int(width)}:{int(height)}"
+
+
+def default_output_name(first_file):
+    """Build the default GIF name from the first image name and its date."""
+    base_name = os.path.splitext(os.path.basename(first_file))[0]
+    return f"{base_name}_{get_image_date(first_file)}.gif"
+
+
+def check_single_format(files):
+    """Raise ValueError if files mix image formats.
+
+    FFmpeg's concat demuxer keeps the first file's decoder, so frames in
+    another format would be silently dropped.
+    """
+    formats = sorted({IMAGE_FORMATS.get(os.path.splitext(path)[1].lower(), os.path.splitext(path)[1].upper())
+                      for path in files})
+    if len(formats) > 1:
+        raise ValueError(f"Images mix formats ({', '.join(formats)}); FFmpeg reads one format per "
+                         f"sequence, so select images of one format")
+
+
+def write_concat_manifest(files, manifest_path, framerate, durations=None):
+    """Write an FFmpeg concat manifest listing files in order.
+
+    Without durations every frame lasts 1/framerate. With durations (seconds,
+    one per file) each is written as its GIF delay (see get_frame_delays),
+    so timestamps match the GIF's centisecond resolution.
+    """
+    frame_duration = 1 / float(framerate)
+    delays = get_frame_delays(len(files), framerate, durations) if durations is not None else None
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write("ffconcat version 1.0\n")
+        for i, path in enumerate(files):
+            # Escape single quotes for the concat demuxer's quoting rules
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+            if durations is None:
+                # Each image otherwise lasts image2's default 1/25 s, padding the end above 25 fps
+                f.write(f"option framerate {framerate}\n")
+                f.write(f"duration {frame_duration:.6f}\n")
+            else:
+                f.write("option framerate 100\n")
+                f.write(f"duration {delays[i] / 100:.2f}\n")
+
+
+def get_timing_args(framerate, durations=None):
+    """Build FFmpeg output timing args for a concat manifest input."""
+    if durations is None:
+        return ["-r", framerate]
+    # Keep the manifest timestamps; the muxer needs the last delay explicitly
+    final_delay = get_frame_delays(1, framerate, durations[-1:])[0]
+    return ["-fps_mode", "passthrough", "-final_delay", str(final_delay)]
+
+
+def get_frame_delays(frame_count, framerate, durations=None):
+    """Return each frame's GIF delay in centiseconds, as FFmpeg times one encode.
+
+    At a constant frame rate, every frame's start time is rounded (half up)
+    to centiseconds, so at 3 fps delays run 33, 34, 33; the last frame gets
+    its own rounded duration. With durations (seconds, one per frame), each
+    is rounded on its own. Every encoder and encode mode uses these, so the
+    same input gets the same timing. Delays are at least 1.
+    """
+    if durations is not None:
+        return [max(1, int(duration * 100 + 0.5)) for duration in durations]
+    if not frame_count:
+        return []
+    starts = [int(100 * i / float(framerate) + 0.5) for i in range(frame_count)]
+    starts.append(starts[-1] + int(100 / float(framerate) + 0.5))
+    return [max(1, end - start) for start, end in zip(starts, starts[1:])]
+
+
+def split_into_chunks(items, chunk_count, min_chunk_size=10):
+    """Split a list into at most chunk_count contiguous, evenly sized chunks."""
+    chunk_count = max(1, min(chunk_count, len(items) // min_chunk_size))
+    base, extra = divmod(len(items), chunk_count)
+    chunks = []
+    start = 0
+    for i in range(chunk_count):
+        end = start + base + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def read_gif_sub_blocks(f):
+    """Read a run of GIF data sub-blocks, including the terminator, from a stream."""
+    chunks = []
+    while True:
+        size = f.read(1)
+        if not size:
+            raise ValueError("Truncated GIF data")
+        chunks.append(size)
+        if size == b"\x00":
+            return b"".join(chunks)
+        chunks.append(f.read(size[0]))
+
+
+def read_gif_header(f, path="<stream>"):
+    """Read a GIF's header and global color table from a stream."""
+    header = f.read(13)
+    if header[:6] not in (b"GIF87a", b"GIF89a") or len(header) < 13:
+        raise ValueError(f"Not a GIF file: {path}")
+    flags = header[10]
+    color_table = b""
+    if flags & 0x80:
+        color_table = f.read(3 * (2 << (flags & 0x07)))
+    return header, color_table
+
+
+def iter_gif_frames(f, path="<stream>"):
+    """Yield (app_extensions, extensions, image) for each frame after the header.
+
+    Frames are read one at a time, so memory use doesn't grow with the GIF.
+    extensions holds the Graphic Control Extension and anything else
+    preceding the image. app_extensions holds application extensions (loop
+    count) before the first frame and is empty for later frames.
+    """
+    app_extensions = b""
+    pending = b""
+    first = True
+    while True:
+        block_type = f.read(1)
+        if not block_type or block_type == b"\x3B":  # Trailer
+            return
+        if block_type == b"\x21":  # Extension
+            label = f.read(1)
+            block = block_type + label + read_gif_sub_blocks(f)
+            # Application extensions (loop count) before the first frame
+            if label == b"\xFF" and first and not pending:
+                app_extensions += block
+            else:
+                pending += block
+        elif block_type == b"\x2C":  # Image descriptor
+            descriptor = block_type + f.read(9)
+            local_flags = descriptor[9]
+            if local_flags & 0x80:
+                descriptor += f.read(3 * (2 << (local_flags & 0x07)))
+            image = descriptor + f.read(1) + read_gif_sub_blocks(f)  # LZW minimum code size, then data
+            yield (app_extensions if first else b""), pending, image
+            pending = b""
+            first = False
+        else:
+            raise ValueError(f"Corrupt GIF block at byte {f.tell() - 1}: {path}")
+
+
+def count_gif_frames(path):
+    """Count a GIF file's frames without keeping them in memory."""
+    with open(path, "rb") as f:
+        read_gif_header(f, path)
+        return sum(1 for _ in iter_gif_frames(f, path))
+
+
+def read_gif_blocks(path):
+    """Split a GIF file into header, global color table, extensions and frames."""
+    with open(path, "rb") as f:
+        return parse_gif_stream(f, path)
+
+
+def parse_gif_blocks(data, path="<bytes>"):
+    """Split GIF data into header, global color table, extensions and frames."""
+    return parse_gif_stream(io.BytesIO(data), path)
+
+
+def parse_gif_stream(f, path="<stream>"):
+    """Read a whole GIF stream into header, global color table, extensions and frames.
+
+    Each frame is a (extensions, image) pair of raw bytes. Use
+    iter_gif_frames instead to keep memory bounded.
+    """
+    header, color_table = read_gif_header(f, path)
+    app_extensions = b""
+    frames = []
+    for frame_app_extensions, extensions, image in iter_gif_frames(f, path):
+        app_extensions += frame_app_extensions
+        frames.append((extensions, image))
+    return header, color_table, app_extensions, frames
+
+
+def add_local_color_table(image, header, color_table):
+    """Attach a GIF's global palette to one of its image blocks as a local palette.
+
+    Lets the frame be copied into a GIF with a different global palette
+    without changing its pixels. Frames that already have one are unchanged.
+    """
+    if image[9] & 0x80:
+        return image
+    flags = header[10]
+    local_flags = 0x80 | (image[9] & 0x40) | ((flags & 0x08) << 2) | (flags & 0x07)
+    return image[:9] + bytes([local_flags]) + color_table + image[10:]
+
+
+def join_gif_segments(segment_paths, output_path):
+    """Losslessly join GIF segments that share the same screen size.
+
+    Header, global palette and loop extension come from the first segment.
+    Frames from later segments with a different global palette get it
+    attached as a local color table so their pixels are unchanged. Frames
+    are streamed one at a time, so memory use doesn't grow with the GIF.
+    """
+    with open(output_path, "wb") as out:
+        base_table = None
+        for segment_path in segment_paths:
+            with open(segment_path, "rb") as f:
+                seg_header, seg_table = read_gif_header(f, segment_path)
+                if base_table is None:
+                    base_table = seg_table
+                    out.write(seg_header + seg_table)
+                for app_extensions, extensions, image in iter_gif_frames(f, segment_path):
+                    if segment_path == segment_paths[0]:
+                        out.write(app_extensions)
+                    if seg_table != base_table:
+                        image = add_local_color_table(image, seg_header, seg_table)
+                    out.write(extensions + image)
+        out.write(b"\x3B")
+
+
+def get_cache_dir():
+    """Get the cache directory for scaled frames and palettes."""
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "FFGIF Maker")
+
+
+def get_scratch_dir(scratch_dir=None):
+    """Pick the folder for builds' temporary files.
+
+    scratch_dir if given, else the first of SCRATCH_CANDIDATES with
+    SCRATCH_MIN_FREE_BYTES free, else the system temp folder.
+    """
+    if scratch_dir:
+        return scratch_dir
+    for candidate in SCRATCH_CANDIDATES:
+        try:
+            if os.access(candidate, os.W_OK) and shutil.disk_usage(candidate).free >= SCRATCH_MIN_FREE_BYTES:
+                return candidate
+        except OSError:
+            continue
+    return tempfile.gettempdir()
+
+
+def get_temp_output_path(output_path, work_dir):
+    """Name the hidden file an output is written to before being renamed into place.
+
+    It sits next to output_path, so the rename is atomic, and is named after
+    the build's private work_dir, so concurrent builds never share it.
+    """
+    folder, name = os.path.split(os.path.abspath(output_path))
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{stem}{os.path.basename(work_dir)}.tmp{ext}")
+
+
+def get_frame_cache_key(filepath, scale):
+    """Build a cache key from the source file identity and scale string."""
+    stat = os.stat(filepath)
+    identity = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}|{scale}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def get_palette_cache_key(frame_keys, palette_filter):
+    """Build a cache key for a palette from its frames and palettegen options."""
+    digest = hashlib.sha1(palette_filter.encode("utf-8"))
+    for key in frame_keys:
+        digest.update(key.encode("ascii"))
+    return digest.hexdigest()
+
+
+def touch_cache_entry(path):
+    """Mark a cache entry as recently used."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_cache(cache_dir, max_bytes=CACHE_MAX_BYTES):
+    """Delete least recently used cache entries until under max_bytes.
+
+    Returns the number of bytes freed.
+    """
+    entries = []
+    total = 0
+    for sub_dir in ("frames", "palettes", "proxies"):
+        path = os.path.join(cache_dir, sub_dir)
+        if not os.path.isdir(path):
+            continue
+        for entry in os.scandir(path):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    return freed
+
+
+def get_capture_index_path(folder, cache_dir=None):
+    """Get the capture time index file for an image folder."""
+    key = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir or get_cache_dir(), "index", f"{key}.json")
+
+
+def load_capture_times(files, cache_dir=None):
+    """Return capture times for files using a per-folder index.
+
+    Each folder's index maps file names to (mtime_ns, size, capture time),
+    so only new or changed files are read again. Returns a list of
+    datetimes, None where a file has no EXIF capture time.
+    """
+    by_folder = {}
+    for i, filepath in enumerate(files):
+        by_folder.setdefault(os.path.dirname(os.path.abspath(filepath)), []).append(i)
+
+    results = [None] * len(files)
+    for folder, indexes in by_folder.items():
+        index_path = get_capture_index_path(folder, cache_dir)
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        stale = []
+        for i in indexes:
+            name = os.path.basename(files[i])
+            try:
+                stat = os.stat(files[i])
+            except OSError:
+                continue
+            entry = index.get(name)
+            if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                results[i] = datetime.fromisoformat(entry[2]) if entry[2] else None
+            else:
+                stale.append((i, name, stat))
+
+        if not stale:
+            continue
+        dates = get_capture_times([files[i] for i, _, _ in stale])
+        for (i, name, stat), date in zip(stale, dates):
+            results[i] = date
+            index[name] = [stat.st_mtime_ns, stat.st_size, date.isoformat() if date else None]
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            temp_path = f"{index_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(temp_path, index_path)
+        except OSError:
+            pass
+    return results
+
+
+def get_frame_times(files, cache_dir=None):
+    """Return a timestamp (seconds) per file: EXIF capture time, else modification time."""
+    times = []
+    for filepath, date in zip(files, load_capture_times(files, cache_dir)):
+        if date is not None:
+            times.append(date.timestamp())
+        else:
+            try:
+                times.append(os.path.getmtime(filepath))
+            except OSError:
+                times.append(0.0)
+    return times
+
+
+def sort_by_capture_time(files, cache_dir=None):
+    """Sort files by capture time, using the file name to break ties.
+
+    Returns (sorted_files, frame_times) with the times in the new order.
+    """
+    times = get_frame_times(files, cache_dir)
+    order = sorted(range(len(files)), key=lambda i: (times[i], os.path.basename(files[i])))
+    return [files[i] for i in order], [times[i] for i in order]
+
+
+def get_gap_durations(frame_times, framerate, max_gap_factor=MAX_GAP_FACTOR):
+    """Turn capture times into per-frame durations that keep the real gaps.
+
+    Gaps are scaled so the median gap plays at the chosen frame rate; longer
+    or shorter gaps stay proportionally longer or shorter. Each duration is
+    clamped between 0.02s (the shortest delay browsers honour) and
+    max_gap_factor frames, so overnight breaks don't stall the GIF. The last
+    frame gets one normal frame duration.
+    """
+    frame_duration = 1 / float(framerate)
+    gaps = [max(0.0, later - earlier) for earlier, later in zip(frame_times, frame_times[1:])]
+    positive = sorted(gap for gap in gaps if gap > 0)
+    if not positive:
+        return [frame_duration] * len(frame_times)
+
+    median_gap = positive[len(positive) // 2]
+    longest = frame_duration * max_gap_factor
+    durations = [min(longest, max(0.02, gap / median_gap * frame_duration)) for gap in gaps]
+    return durations + [frame_duration]
+
+
+def prepare_cached_frames(ffmpeg_bin, files, framerate, scale, cache_dir, log=ignore, on_progress=None,
+                          cancel=None):
+    """Return cached scaled frames for files, scaling only the missing ones.
+
+    Returns (cached_paths, frame_keys, hit_count).
+    """
+    frames_dir = os.path.join(cache_dir, "frames")
+    os.makedirs(frames_dir, exist_ok=True)
+
+    frame_keys = [get_frame_cache_key(path, scale) for path in files]
+    cached_paths = [os.path.join(frames_dir, f"{key}.png") for key in frame_keys]
+
+    misses = []
+    for source, cached in zip(files, cached_paths):
+        if os.path.exists(cached):
+            touch_cache_entry(cached)
+        else:
+            misses.append((source, cached))
+
+    if misses:
+        # Scale all missing frames in one FFmpeg run into a private folder
+        # (as bgra, the format paletteuse sees, so output matches uncached),
+        # then move them into place so concurrent builds never see partial files
+        work_dir = os.path.join(cache_dir, f"tmp-{os.getpid()}-{threading.get_ident()}")
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            manifest_path = os.path.join(work_dir, "frames.ffconcat")
+            write_concat_manifest([source for source, _ in misses], manifest_path, framerate)
+            run_ffmpeg([
+                ffmpeg_bin, "-y", "-reinit_filter", "0",
+                "-f", "concat", "-safe", "0", "-i", manifest_path,
+                "-vf", f"scale={scale},format=bgra", "-fps_mode", "passthrough",
+                "-start_number", "0", os.path.join(work_dir, "%08d.png")
+            ], f"Caching {len(misses)} scaled frames", log, on_progress, cancel)
+            for i, (_, cached) in enumerate(misses):
+                os.replace(os.path.join(work_dir, f"{i:08d}.png"), cached)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return cached_paths, frame_keys, len(files) - len(misses)
+
+
+def parse_progress_block(block):
+    """Convert one block of FFmpeg -progress key=value pairs into stats."""
+    def to_float(value):
+        try:
+            return float(value.strip().rstrip("x"))
+        except (AttributeError, ValueError):
+            return None
+
+    frame = block.get("frame", "0")
+    return {
+        "frame": int(frame) if frame.isdigit() else 0,
+        "fps": to_float(block.get("fps")) or 0.0,
+        "speed": to_float(block.get("speed")),
+        "done": block.get("progress") == "end",
+    }
+
+
+def read_ffmpeg_progress(stream, on_progress):
+    """Read FFmpeg's -progress stream and call on_progress for each block."""
+    block = {}
+    for line in stream:
+        key, _, value = line.strip().partition("=")
+        block[key] = value
+        if key == "progress":
+            on_progress(parse_progress_block(block))
+            block = {}
+
+
+def format_eta(seconds):
+    """Format a number of seconds as H:MM:SS or M:SS."""
+    seconds = int(round(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def format_progress_info(done_frames, total_frames, fps, speed=None):
+    """Describe frame progress, throughput and ETA in one line."""
+    info = f"{done_frames}/{total_frames} frames  |  {fps:.1f} fps"
+    if speed is not None:
+        info += f"  |  {speed:.2f}x"
+    if fps > 0 and total_frames > done_frames:
+        info += f"  |  ETA {format_eta((total_frames - done_frames) / fps)}"
+    return info
+
+
+def make_step_progress(on_progress, total_frames, start_pct, end_pct):
+    """Map FFmpeg progress stats onto a slice of the overall percentage.
+
+    Returns a callback for run_ffmpeg, or None when on_progress is None.
+    """
+    if on_progress is None:
+        return None
+
+    def on_step_progress(stats):
+        fraction = min(stats["frame"] / total_frames, 1.0) if total_frames else 0.0
+        on_progress(start_pct + (end_pct - start_pct) * fraction,
+                    format_progress_info(stats["frame"], total_frames, stats["fps"], stats["speed"]))
+    return on_step_progress
+
+
+def feed_stdin(process, chunks, errors):
+    """Write chunks of bytes to process's stdin, then close it.
+
+    Stops quietly if FFmpeg exits early; any other error (e.g. an image
+    that fails to decode) is appended to errors for run_ffmpeg to raise.
+    """
+    try:
+        for chunk in chunks:
+            process.stdin.buffer.write(chunk)
+    except (BrokenPipeError, ValueError):
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+
+def wait_for_process(process):
+    """Wait for a process to exit and return its (rusage, io) usage, each None where unsupported."""
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None, None
+    io_counters = None
+    try:
+        if hasattr(os, "waitid"):
+            # Wait without reaping, so its I/O counters can still be read
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+            io_counters = read_process_io(process.pid)
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped by Popen (a cancel's terminate() or poll()), taking its usage with it
+        process.wait()
+        return None, None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return rusage, io_counters
+
+
+def run_ffmpeg(cmd, step_name, log=ignore, on_progress=None, cancel=None, stdin_chunks=None):
+    """Run FFmpeg command, passing its output to log.
+
+    With on_progress, FFmpeg writes machine-readable progress to stdout,
+    which is parsed on a helper thread and passed to on_progress as dicts.
+    With a CancelToken, the process is terminated when the token is
+    cancelled and BuildCancelled is raised. stdin_chunks (an iterable of
+    bytes, e.g. raw frames for "-i pipe:0") is written to FFmpeg's stdin
+    from a helper thread. The process's resource usage is added to
+    cancel's totals (see CancelToken.record_usage).
+    """
+    if cancel:
+        cancel.check()
+    if on_progress:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+
+    log(f"\n{'='*50}\n{step_name}\n{'='*50}\n")
+    log(f"$ {' '.join(cmd)}\n\n")
+
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if stdin_chunks is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if cancel:
+        cancel.register(process)
+
+    feed_thread = None
+    feed_errors = []
+    if stdin_chunks is not None:
+        feed_thread = threading.Thread(target=feed_stdin, args=(process, stdin_chunks, feed_errors))
+        feed_thread.daemon = True
+        feed_thread.start()
+
+    progress_thread = None
+    if on_progress:
+        progress_thread = threading.Thread(target=read_ffmpeg_progress, args=(process.stdout, on_progress))
+        progress_thread.daemon = True
+        progress_thread.start()
+
+    # FFmpeg outputs to stderr
+    output_lines = []
+    peak_rss = None
+    for line in process.stderr:
+        output_lines.append(line)
+        log(line)
+        # The high-water mark only grows, and FFmpeg's last lines come once it is done
+        peak_rss = get_process_peak_rss(process.pid) or peak_rss
+
+    rusage, io_counters = wait_for_process(process)
+    if progress_thread:
+        progress_thread.join()
+    if feed_thread:
+        feed_thread.join()
+    if cancel:
+        cancel.unregister(process)
+        if rusage is not None:
+            cancel.record_usage(rusage, io_counters, peak_rss)
+        cancel.check()
+    if feed_errors:
+        raise feed_errors[0]
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=''.join(output_lines))
+
+    return ''.join(output_lines)
+
+
+def encode_chunks_parallel(ffmpeg_bin, files, work_dir, framerate, scale_filter, palette_path,
+                           output_path, durations, temp_paths, log=ignore, on_status=ignore,
+                           on_progress=None, cancel=None, paletteuse_filter="paletteuse=dither=floyd_steinberg"):
+    """Encode chunks of frames against one palette in parallel, then join them."""
+    chunk_count = os.cpu_count() or 1
+    indices = split_into_chunks(list(range(len(files))), chunk_count)
+    # Each chunk's timestamps restart at zero, so give it the whole GIF's delays
+    delays = get_frame_delays(len(files), framerate, durations)
+    chunk_jobs = []
+    for i, chunk in enumerate(indices):
+        chunk_manifest = os.path.join(work_dir, f"chunk_{i:03d}.ffconcat")
+        chunk_output = os.path.join(work_dir, f"chunk_{i:03d}.gif")
+        temp_paths.extend([chunk_manifest, chunk_output])
+        chunk_durations = [delays[j] / 100 for j in chunk]
+        write_concat_manifest([files[j] for j in chunk], chunk_manifest, framerate, chunk_durations)
+        chunk_jobs.append((i, len(chunk), chunk_manifest, chunk_output, chunk_durations))
+
+    total = len(chunk_jobs)
+    on_status(f"Creating GIF in {total} parallel chunks...")
+
+    # Per-chunk frame counts and fps, combined into one progress readout
+    chunk_frames = [0] * total
+    chunk_fps = [0.0] * total
+
+    def make_chunk_handler(i):
+        def on_chunk_progress(stats):
+            chunk_frames[i] = stats["frame"]
+            chunk_fps[i] = 0.0 if stats["done"] else stats["fps"]
+            done_frames = sum(chunk_frames)
+            breakdown = "  ".join(
+                f"#{n + 1}: {100 * chunk_frames[n] // max(1, job[1])}%" for n, job in enumerate(chunk_jobs))
+            if on_progress:
+                on_progress(50 + 45 * done_frames / len(files),
+                            format_progress_info(done_frames, len(files), sum(chunk_fps)))
+            on_status(f"Creating GIF in chunks  {breakdown}")
+        return on_chunk_progress
+
+    def encode_chunk(job):
+        i, frame_count, chunk_manifest, chunk_output, chunk_durations = job
+        chunk_start = time.perf_counter()
+        run_ffmpeg([
+            ffmpeg_bin, "-y", "-reinit_filter", "0",
+            "-f", "concat", "-safe", "0", "-i", chunk_manifest,
+            "-i", palette_path,
+            "-lavfi", f"{scale_filter}[s];[s][1:v]{paletteuse_filter}",
+            *get_timing_args(framerate, chunk_durations), "-loop", "0", chunk_output
+        ], f"Step 2: Creating chunk {i + 1}/{total} ({frame_count} frames)", log, make_chunk_handler(i),
+            cancel)
+        return i, frame_count, time.perf_counter() - chunk_start
+
+    with ThreadPoolExecutor(max_workers=chunk_count) as executor:
+        futures = [executor.submit(encode_chunk, job) for job in chunk_jobs]
+        for future in as_completed(futures):
+            i, frame_count, chunk_time = future.result()
+            log(f"\nChunk {i + 1}/{total}: {frame_count} frames in {chunk_time:.2f}s\n")
+
+    join_start = time.perf_counter()
+    join_gif_segments([job[3] for job in chunk_jobs], output_path)
+    join_time = time.perf_counter() - join_start
+    log(f"\nJoined {total} chunks in {join_time:.2f}s\n")
+
+
+def compute_frame_signatures(ffmpeg_bin, files, work_dir, log=ignore, on_progress=None, cancel=None):
+    """Shrink every frame to a tiny grayscale thumbnail for comparing frames.
+
+    FFmpeg decodes and averages down contiguous chunks of files in parallel
+    processes. Returns one bytes object of DEDUPE_SIGNATURE_SIZE squared
+    pixels per file.
+    """
+    chunk_count = os.cpu_count() or 1
+    indices = split_into_chunks(list(range(len(files))), chunk_count, min_chunk_size=50)
+    chunk_frames = [0] * len(indices)
+    size = DEDUPE_SIGNATURE_SIZE
+
+    def make_chunk_handler(i):
+        def on_chunk_progress(stats):
+            chunk_frames[i] = stats["frame"]
+            done_frames = sum(chunk_frames)
+            on_progress(100 * done_frames / len(files), format_progress_info(done_frames, len(files), stats["fps"]))
+        return on_chunk_progress if on_progress else None
+
+    def sign_chunk(i):
+        chunk_manifest = os.path.join(work_dir, f"signatures_{i:03d}.ffconcat")
+        chunk_output = os.path.join(work_dir, f"signatures_{i:03d}.gray")
+        write_concat_manifest([files[j] for j in indices[i]], chunk_manifest, "1")
+        run_ffmpeg([
+            ffmpeg_bin, "-y", "-reinit_filter", "0",
+            "-f", "concat", "-safe", "0", "-i", chunk_manifest,
+            "-vf", f"scale={size}:{size}:flags=area,format=gray",
+            "-fps_mode", "passthrough", "-f", "rawvideo", chunk_output
+        ], f"Finding duplicates: chunk {i + 1}/{len(indices)} ({len(indices[i])} frames)", log,
+            make_chunk_handler(i), cancel)
+        with open(chunk_output, "rb") as f:
+            data = f.read()
+        frame_bytes = size * size
+        return [data[n:n + frame_bytes] for n in range(0, len(data), frame_bytes)]
+
+    with ThreadPoolExecutor(max_workers=chunk_count) as executor:
+        chunks = list(executor.map(sign_chunk, range(len(indices))))
+
+    signatures = [signature for chunk in chunks for signature in chunk]
+    if len(signatures) != len(files):
+        raise ValueError(f"Expected {len(files)} frame signatures, FFmpeg produced {len(signatures)}")
+    return signatures
+
+
+def find_duplicate_frames(signatures, threshold):
+    """Return the indexes of frames to keep, dropping near-duplicates.
+
+    A frame is dropped when its mean absolute difference (0-255) from the
+    last kept frame is at most threshold. Comparing against the last kept
+    frame stops slow changes from being dropped one small step at a time.
+    With NumPy, the last kept frame is compared with a block of the frames
+    after it at once, growing while they stay duplicates.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    keep = [0]
+    if np is not None:
+        frames = np.frombuffer(b"".join(signatures), dtype=np.uint8).reshape(len(signatures), -1)
+        frames = frames.astype(np.int16)
+        i = 1
+        block = DEDUPE_COMPARE_BLOCK
+        while i < len(frames):
+            differences = np.abs(frames[i:i + block] - frames[keep[-1]]).mean(axis=1)
+            changed = np.flatnonzero(differences > threshold)
+            if not len(changed):
+                i += len(differences)
+                block = min(block * 2, DEDUPE_COMPARE_BLOCK_MAX)
+                continue
+            i += int(changed[0])
+            keep.append(i)
+            i += 1
+            block = DEDUPE_COMPARE_BLOCK
+        return keep
+
+    kept = signatures[0]
+    for i in range(1, len(signatures)):
+        signature = signatures[i]
+        difference = sum(map(abs, map(operator.sub, signature, kept))) / len(signature)
+        if difference > threshold:
+            keep.append(i)
+            kept = signature
+    return keep
+
+
+def merge_duplicate_frames(files, keep, framerate, durations=None):
+    """Drop the frames not in keep, adding their durations to the previous kept frame."""
+    if durations is None:
+        durations = [1 / float(framerate)] * len(files)
+    merged = []
+    for n, start in enumerate(keep):
+        end = keep[n + 1] if n + 1 < len(keep) else len(files)
+        merged.append(sum(durations[start:end]))
+    return [files[i] for i in keep], merged
+
+
+def get_palettegen_filter(max_colors=256):
+    """Build the palettegen filter for a palette of at most max_colors."""
+    if max_colors >= 256:
+        return "palettegen=stats_mode=diff"
+    return f"palettegen=max_colors={max_colors}:stats_mode=diff"
+
+
+def multiply_scale(scale, factor):
+    """Shrink an FFmpeg scale string by factor, e.g. iw*0.5:ih*0.5 by 0.5 -> iw*0.25:ih*0.25."""
+    if factor == 1:
+        return scale
+    width, height = scale.split(":")
+    if width.startswith("iw*") and height.startswith("ih*") and width[3:] == height[3:]:
+        return make_scale_string(factor=float(width[3:]) * factor)
+    if width.isdigit() and height.isdigit():
+        return make_scale_string(width=max(1, int(int(width) * factor)), height=max(1, int(int(height) * factor)))
+    return f"({width})*{factor:.4f}:({height})*{factor:.4f}"
+
+
+def step_frames(files, frame_step, framerate, durations=None):
+    """Keep every frame_step-th frame, stretching frames so playback speed is unchanged.
+
+    Returns (files, framerate, durations).
+    """
+    if frame_step == 1:
+        return files, framerate, durations
+    if durations is None:
+        return files[::frame_step], f"{float(framerate) / frame_step:g}", None
+    kept, durations = merge_duplicate_frames(files, list(range(0, len(files), frame_step)), framerate, durations)
+    return kept, framerate, durations
+
+
+def select_size_sample(files):
+    """Pick TARGET_SAMPLE_CLIPS evenly spaced clips of consecutive frames.
+
+    Consecutive frames matter because GIF frames only store what changed.
+    """
+    clip_count = TARGET_SAMPLE_CLIPS
+    if len(files) <= clip_count * TARGET_CLIP_FRAMES:
+        return list(files)
+    sample = []
+    for i in range(clip_count):
+        start = i * (len(files) - TARGET_CLIP_FRAMES) // (clip_count - 1) if clip_count > 1 else 0
+        sample.extend(files[start:start + TARGET_CLIP_FRAMES])
+    return sample
+
+
+def estimate_gif_size(ffmpeg_bin, files, framerate, scale, max_colors, dither, work_dir, name, cancel=None):
+    """Estimate the full GIF's size by encoding a sample of its frames.
+
+    Returns the estimated bytes for all of files.
+    """
+    sample = select_size_sample(files)
+    manifest = os.path.join(work_dir, f"{name}.ffconcat")
+    output = os.path.join(work_dir, f"{name}.gif")
+    write_concat_manifest(sample, manifest, framerate)
+    run_ffmpeg([
+        ffmpeg_bin, "-y", "-reinit_filter", "0", "-f", "concat", "-safe", "0", "-i", manifest,
+        "-lavfi", f"scale={scale},split[a][b];[a]{get_palettegen_filter(max_colors)}[p];"
+                  f"[b][p]paletteuse=dither={dither}",
+        "-r", framerate, "-loop", "0", output
+    ], f"Size trial {name}", ignore, None, cancel)
+    return os.path.getsize(output) * len(files) / len(sample)
+
+
+def search_target_settings(ffmpeg_bin, files, framerate, scale, durations, target_bytes, work_dir,
+                           max_colors=256, dither="floyd_steinberg", log=ignore, on_status=ignore, cancel=None):
+    """Find settings expected to fit the GIF under target_bytes.
+
+    The requested colors and dither come first, followed by the later
+    TARGET_SIZE_STEPS entries (never with more colors than requested).
+    Tries each step in parallel: a trial at the requested
+    scale, then up to two more at scales predicted from the byte estimates
+    (size grows roughly with pixel count, so with the square of the scale).
+    Picks the first step whose scale stays at or above TARGET_MIN_SCALE,
+    else the step keeping the largest scale. Raises ValueError when nothing
+    fits. Returns a dict describing the choice.
+    """
+    budget = target_bytes * TARGET_SIZE_MARGIN
+    candidates = [(1, max_colors, dither)]
+    for frame_step, step_colors, step_dither in TARGET_SIZE_STEPS[1:]:
+        candidate = (frame_step, min(step_colors, max_colors), step_dither)
+        if candidate not in candidates:
+            candidates.append(candidate)
+
+    steps = []
+    for frame_step, step_colors, step_dither in candidates:
+        step_files, step_rate, _ = step_frames(files, frame_step, framerate, durations)
+        steps.append({"frame_step": frame_step, "max_colors": step_colors, "dither": step_dither,
+                      "files": step_files, "framerate": step_rate, "scale_factor": 1.0,
+                      "fit": None, "estimate": None})
+
+    trial_count = 0
+
+    def run_trial(step, n):
+        return estimate_gif_size(ffmpeg_bin, step["files"], step["framerate"],
+                                 multiply_scale(scale, step["scale_factor"]), step["max_colors"],
+                                 step["dither"], work_dir, f"trial_{n:03d}", cancel)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        for round_number in range(3):
+            pending = [step for step in steps if step["scale_factor"] is not None]
+            if not pending:
+                break
+            on_status(f"Fitting under {format_file_size(target_bytes)}: "
+                      f"trial round {round_number + 1} ({len(pending)} encodes)...")
+            estimates = list(executor.map(run_trial, pending, range(trial_count, trial_count + len(pending))))
+            trial_count += len(pending)
+
+            for step, estimate in zip(pending, estimates):
+                factor = step["scale_factor"]
+                log(f"Trial: step {step['frame_step']}, {step['max_colors']} colors, {step['dither']}, "
+                    f"scale {factor:.2f} -> ~{format_file_size(int(estimate))}\n")
+                if estimate <= budget and (step["fit"] is None or factor > step["fit"]):
+                    step["fit"], step["estimate"] = factor, estimate
+                # Predict the scale that just fits, never retrying one already known to fit
+                predicted = min(1.0, factor * (budget / estimate) ** 0.5 * (0.97 if estimate > budget else 1.0))
+                if (factor == 1.0 and estimate <= budget) or predicted < 0.05 or \
+                        (step["fit"] is not None and predicted <= step["fit"] * 1.02):
+                    step["scale_factor"] = None
+                else:
+                    step["scale_factor"] = predicted
+
+    fitting = [step for step in steps if step["fit"] is not None]
+    if not fitting:
+        raise ValueError(f"Can't fit the GIF under {format_file_size(target_bytes)}, even at the smallest settings")
+    preferred = [step for step in fitting if step["fit"] >= TARGET_MIN_SCALE]
+    chosen = preferred[0] if preferred else max(fitting, key=lambda step: step["fit"])
+    return {
+        "target_bytes": target_bytes,
+        "estimated_bytes": int(chosen["estimate"]),
+        "scale_factor": chosen["fit"],
+        "frame_step": chosen["frame_step"],
+        "max_colors": chosen["max_colors"],
+        "dither": chosen["dither"],
+        "trials": trial_count,
+    }
+
+
+def select_palette_sample(files, method, amount=None, seed=0):
+    """Pick the frames a palette is built from, keeping their order.
+
+    method is "stride" for every amount-th frame or "random" for amount
+    frames chosen with a fixed seed; anything else returns every frame.
+    """
+    if method == "stride":
+        return files[::max(1, int(amount or 1))]
+    if method == "random":
+        count = min(len(files), max(1, int(amount or PALETTE_AUTO_START_FRAMES)))
+        return [files[i] for i in sorted(random.Random(seed).sample(range(len(files)), count))]
+    return list(files)
+
+
+def evenly_spaced(items, count):
+    """Pick count items spread evenly over a list, including the first."""
+    if count >= len(items):
+        return list(items)
+    return [items[i * len(items) // count] for i in range(count)]
+
+
+def read_palette_colors(ffmpeg_bin, palette_path):
+    """Read the opaque colors of a palettegen PNG as a list of (r, g, b) tuples."""
+    result = subprocess.run(
+        [ffmpeg_bin, "-v", "error", "-i", palette_path, "-f", "rawvideo", "-pix_fmt", "rgba", "-"],
+        capture_output=True, check=True
+    )
+    data = result.stdout
+    # palettegen marks its reserved transparent entry with alpha 0
+    return sorted({tuple(data[i:i + 3]) for i in range(0, len(data), 4) if data[i + 3]})
+
+
+def rgb_to_lab(color):
+    """Convert an sRGB (r, g, b) tuple of 0-255 values to CIELAB (D65)."""
+    def linear(value):
+        value /= 255
+        return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+    r, g, b = (linear(value) for value in color)
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+
+    def f(t):
+        return t ** (1 / 3) if t > 0.008856 else 7.787 * t + 16 / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+def palette_delta_e(reference, candidate):
+    """Mean CIE76 color difference from each reference color to its nearest candidate color.
+
+    0 means every reference color is in the candidate palette; around 2.3
+    is a just noticeable difference.
+    """
+    if not reference or not candidate:
+        return None
+    candidate_lab = [rgb_to_lab(color) for color in candidate]
+    total = 0.0
+    for color in reference:
+        l1, a1, b1 = rgb_to_lab(color)
+        total += min((l1 - l2) ** 2 + (a1 - a2) ** 2 + (b1 - b2) ** 2 for l2, a2, b2 in candidate_lab) ** 0.5
+    return total / len(reference)
+
+
+def generate_sampled_palette(ffmpeg_bin, files, work_dir, palette_filter, palette_path, method="auto",
+                             amount=None, palette_scale=None, log=ignore, on_progress=None, cancel=None):
+    """Generate palette_path from a sample of files instead of every frame.
+
+    palette_filter is the filter chain up to and including palettegen;
+    palette_scale, if given, is an extra FFmpeg scale string applied to the
+    sample only. With method "auto", evenly spaced samples double in size
+    until the palette changes by at most PALETTE_AUTO_TOLERANCE (mean ΔE),
+    so varied footage gets a bigger sample than uniform footage.
+    Returns the number of frames in the final sample.
+    """
+    if palette_scale:
+        scale, _, rest = palette_filter.rpartition("palettegen")
+        palette_filter = f"{scale}scale={palette_scale}:flags=area,palettegen{rest}"
+
+    def generate(sample, step_name, output_path):
+        manifest = os.path.join(work_dir, "palette_sample.ffconcat")
+        write_concat_manifest(sample, manifest, "1")
+        run_ffmpeg([
+            ffmpeg_bin, "-y", "-reinit_filter", "0", "-f", "concat", "-safe", "0", "-i", manifest,
+            "-lavfi", f"{palette_filter}[p]", "-map", "[p]", output_path
+        ], step_name, log, None, cancel)
+
+    if method != "auto":
+        sample = select_palette_sample(files, method, amount)
+        generate(sample, f"Step 1: Generating palette from {len(sample)} sampled frames", palette_path)
+        return len(sample)
+
+    count = max(1, int(amount or PALETTE_AUTO_START_FRAMES))
+    previous = None
+    while True:
+        sample = evenly_spaced(files, count)
+        generate(sample, f"Step 1: Generating palette from {len(sample)} sampled frames", palette_path)
+        if on_progress:
+            on_progress(min(50.0, 50 * len(sample) / len(files)), f"Palette from {len(sample)} frames")
+        if len(sample) == len(files):
+            return len(sample)
+        colors = read_palette_colors(ffmpeg_bin, palette_path)
+        if previous is not None:
+            change = palette_delta_e(previous, colors)
+            log(f"Palette change from {len(sample) // 2} to {len(sample)} frames: mean ΔE {change:.2f}\n")
+            if change is not None and change <= PALETTE_AUTO_TOLERANCE:
+                return len(sample)
+        previous = colors
+        count *= 2
+
+
+class FFmpegBackend:
+    """Encoder backend that runs the FFmpeg binary (two pass, single pass or parallel chunks)."""
+
+    def __init__(self):
+        self.ffmpeg_bin = find_ffmpeg()
+        if self.ffmpeg_bin is None:
+            raise ValueError("FFmpeg not found. Please install FFmpeg.")
+
+    def frame_signatures(self, files, work_dir, log=ignore, on_progress=None, cancel=None):
+        """Return a tiny grayscale thumbnail per file for duplicate detection."""
+        return compute_frame_signatures(self.ffmpeg_bin, files, work_dir, log, on_progress, cancel)
+
+    def get_draft_size(self, files, scale, log=ignore):
+        """Return the size to pre-decode files at with Pillow, or None to let FFmpeg decode them."""
+        try:
+            from ffgif_decode import get_draft_size
+        except ImportError:
+            log("Fast JPEG decode needs Pillow (pip install Pillow); decoding with FFmpeg\n")
+            return None
+        draft_size = get_draft_size(files, scale)
+        if draft_size is None:
+            log("Fast JPEG decode needs all frames to be JPEGs scaled to half size or less; "
+                "decoding with FFmpeg\n")
+        return draft_size
+
+    def encode(self, files, output_path, framerate, scale, durations, work_dir, temp_paths, timings,
+               log=ignore, on_status=ignore, on_progress=None, cancel=None, encode_mode="two_pass",
+               use_cache=False, palette_sample="all", palette_sample_amount=None, palette_scale=None,
+               measure_palette=False, max_colors=256, dither="floyd_steinberg", predecode=False):
+        """Encode files into output_path, recording step times in timings.
+
+        max_colors limits the palette size and dither is a paletteuse dither
+        mode (see DITHER_MODES). palette_sample picks the palette's frames
+        (see PALETTE_SAMPLE_METHODS and generate_sampled_palette);
+        measure_palette also builds the full palette to report the sample's
+        mean ΔE from it. With predecode, JPEGs are decoded at a reduced size
+        by Pillow (see ffgif_decode) and piped to FFmpeg as raw frames.
+        Returns a dict of extra result fields.
+        """
+        ffmpeg_bin = self.ffmpeg_bin
+        manifest_path = os.path.join(work_dir, "frames.ffconcat")
+        palette_path = os.path.join(work_dir, "palette.png")
+        temp_paths.append(manifest_path)
+        total_frames = len(files)
+        palette_start = 0
+
+        scale_filter = f"scale={scale}"
+        palette_filter = get_palettegen_filter(max_colors)
+        paletteuse_filter = f"paletteuse=dither={dither}"
+        palette_cached = False
+        cache_hits = None
+        palette_frames = total_frames
+        palette_error = None
+        sampled = palette_sample != "all"
+        if use_cache:
+            # Swap sources for cached scaled frames; only new frames get scaled
+            on_status("Checking frame cache...")
+            step_start = time.perf_counter()
+            cache_dir = get_cache_dir()
+            files, frame_keys, cache_hits = prepare_cached_frames(
+                ffmpeg_bin, files, framerate, scale, cache_dir, log,
+                make_step_progress(on_progress, total_frames, 0, 40), cancel)
+            timings["cache"] = time.perf_counter() - step_start
+            palette_start = 40
+            scale_filter = "null"
+            palette_dir = os.path.join(cache_dir, "palettes")
+            os.makedirs(palette_dir, exist_ok=True)
+            sample_spec = f"|{palette_sample}|{palette_sample_amount}|{palette_scale}" if sampled else ""
+            palette_key = get_palette_cache_key(frame_keys, palette_filter + sample_spec)
+            cached_palette_path = os.path.join(palette_dir, f"{palette_key}.png")
+            palette_cached = os.path.exists(cached_palette_path)
+            if palette_cached:
+                palette_path = cached_palette_path
+                touch_cache_entry(palette_path)
+            else:
+                # Generate next to the cache entry under a private name, then move it into place
+                palette_path = os.path.join(palette_dir,
+                                            f"{palette_key}.{os.getpid()}-{threading.get_ident()}.tmp.png")
+                temp_paths.append(palette_path)
+            log(f"Frame cache: {cache_hits}/{total_frames} hits, palette {'hit' if palette_cached else 'miss'}\n")
+        else:
+            temp_paths.append(palette_path)
+
+        # Feed FFmpeg exactly the selected files, in order
+        step_start = time.perf_counter()
+        write_concat_manifest(files, manifest_path, framerate, durations)
+        timings["manifest"] = time.perf_counter() - step_start
+        log(f"Wrote manifest for {total_frames} files in {timings['manifest'] * 1000:.1f} ms\n")
+        input_args = ["-reinit_filter", "0", "-f", "concat", "-safe", "0", "-i", manifest_path]
+        timing_args = get_timing_args(framerate, durations)
+
+        # Each FFmpeg run that reads every frame gets a fresh source: the
+        # manifest, or reduced-size raw frames decoded by Pillow
+        source_scale_filter = scale_filter
+        draft_size = self.get_draft_size(files, scale, log) if predecode else None
+        if draft_size is not None and (use_cache or durations is not None or encode_mode == "parallel"):
+            log("Fast JPEG decode doesn't apply with the frame cache, real time gaps or parallel chunks\n")
+            draft_size = None
+        if draft_size is not None:
+            from ffgif_decode import FrameRing, fill_decoded_frame
+            log(f"Fast JPEG decode: Pillow decodes at reduced size, piping {draft_size[0]}x{draft_size[1]} "
+                f"frames to FFmpeg\n")
+            input_args = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{draft_size[0]}x{draft_size[1]}",
+                          "-framerate", framerate, "-i", "pipe:0"]
+            scale_filter = "null"
+            # One set of frame buffers, reused by every run (they run one after another)
+            ring = FrameRing(draft_size)
+            fill = fill_decoded_frame(ring, files)
+
+        def frame_source():
+            return ring.frames(total_frames, fill) if draft_size is not None else None
+
+        if encode_mode == "single_pass" and sampled:
+            log("Palette sampling needs a separate palette step; using two passes\n")
+        elif encode_mode == "single_pass" and use_cache:
+            log("Single pass doesn't apply with the frame cache, which keeps the palette; using two passes\n")
+        if encode_mode == "single_pass" and not use_cache and not sampled:
+            # Decode and scale once, then split into palettegen and paletteuse.
+            # paletteuse buffers frames until the palette is ready at EOF.
+            on_status("Creating GIF (single pass)...")
+
+            # The extra null output counts frames as they are decoded, since
+            # the GIF itself only starts once the palette is ready
+            step_start = time.perf_counter()
+            run_ffmpeg([
+                ffmpeg_bin, "-y", *input_args,
+                "-lavfi", f"{scale_filter},split=3[a][b][c];[a]{palette_filter}[p];"
+                          f"[b][p]{paletteuse_filter}[out]",
+                "-map", "[c]", "-f", "null", "-",
+                "-map", "[out]", *timing_args, "-loop", "0", output_path
+            ], "Single pass: Generating palette and creating GIF", log,
+                make_step_progress(on_progress, total_frames, 0, 100), cancel, frame_source())
+            timings["encode"] = time.perf_counter() - step_start
+        else:
+            if not palette_cached:
+                # Step 1
+                on_status("Generating color palette...")
+
+                # Generate palette (reinit_filter 0 handles variable-sized images).
+                # The null output counts frames, as palettegen only emits at the end.
+                step_start = time.perf_counter()
+                if sampled:
+                    palette_frames = generate_sampled_palette(
+                        ffmpeg_bin, files, work_dir, f"{source_scale_filter},{palette_filter}", palette_path,
+                        palette_sample, palette_sample_amount, palette_scale, log, on_progress, cancel)
+                else:
+                    run_ffmpeg([
+                        ffmpeg_bin, "-y", *input_args,
+                        "-lavfi", f"{scale_filter},split[a][b];[a]{palette_filter}[p]",
+                        "-map", "[b]", "-f", "null", "-",
+                        "-map", "[p]", palette_path
+                    ], "Step 1: Generating palette", log,
+                        make_step_progress(on_progress, total_frames, palette_start, 50), cancel, frame_source())
+                timings["palette"] = time.perf_counter() - step_start
+                log(f"\nPalette generated from {palette_frames} frames in {timings['palette']:.2f}s\n")
+
+                if sampled and measure_palette:
+                    # Build the full palette too, only to see how close the sample got
+                    on_status("Measuring palette quality...")
+                    step_start = time.perf_counter()
+                    full_palette_path = os.path.join(work_dir, "palette_full.png")
+                    run_ffmpeg([
+                        ffmpeg_bin, "-y", *input_args,
+                        "-lavfi", f"{scale_filter},{palette_filter}", full_palette_path
+                    ], "Measuring palette: generating full palette", log, None, cancel, frame_source())
+                    palette_error = palette_delta_e(read_palette_colors(ffmpeg_bin, full_palette_path),
+                                                    read_palette_colors(ffmpeg_bin, palette_path))
+                    timings["palette_full"] = time.perf_counter() - step_start
+                    log(f"Sampled palette vs full palette: mean ΔE {palette_error:.2f} "
+                        f"(full palette took {timings['palette_full']:.2f}s)\n")
+
+                if use_cache:
+                    try:
+                        os.replace(palette_path, cached_palette_path)
+                    except OSError:
+                        # A concurrent job may have cached the same palette first
+                        if not os.path.exists(cached_palette_path):
+                            raise
+                    palette_path = cached_palette_path
+
+            # Step 2
+            step_start = time.perf_counter()
+            if encode_mode == "parallel":
+                encode_chunks_parallel(ffmpeg_bin, files, work_dir, framerate, scale_filter, palette_path,
+                                       output_path, durations, temp_paths, log, on_status, on_progress,
+                                       cancel, paletteuse_filter)
+            else:
+                on_status("Creating GIF...")
+
+                # Create GIF (reinit_filter 0 handles variable-sized images)
+                run_ffmpeg([
+                    ffmpeg_bin, "-y", *input_args,
+                    "-i", palette_path,
+                    "-lavfi", f"{scale_filter}[s];[s][1:v]{paletteuse_filter}",
+                    *timing_args, "-loop", "0", output_path
+                ], "Step 2: Creating GIF", log,
+                    make_step_progress(on_progress, total_frames, 50, 100), cancel, frame_source())
+            timings["encode"] = time.perf_counter() - step_start
+
+        encoded_frames = count_gif_frames(output_path)
+        if encoded_frames != total_frames:
+            raise ValueError(f"FFmpeg encoded {encoded_frames} of {total_frames} frames")
+
+        if use_cache:
+            freed = evict_cache(get_cache_dir())
+            if freed:
+                log(f"Evicted {format_file_size(freed)} from cache\n")
+
+        return {"cache_hits": cache_hits, "palette_frames": palette_frames, "palette_delta_e": palette_error}
+
+
+def get_frame_delta_optimizer():
+    """Return ffgif_pillow.optimize_frame_deltas, raising ValueError without Pillow and NumPy."""
+    try:
+        from ffgif_pillow import optimize_frame_deltas
+    except ImportError:
+        raise ValueError("Frame delta optimization needs Pillow and NumPy (pip install Pillow numpy)")
+    return optimize_frame_deltas
+
+
+def apply_frame_deltas(input_path, output_path, tolerance, log=ignore, cancel=None):
+    """Write input_path to output_path with only changed pixels stored per frame.
+
+    See ffgif_pillow.optimize_frame_deltas; tolerance 0 is lossless. The
+    GIF is copied unchanged if that turns out no smaller (or its frames
+    don't share one palette). Returns a dict with the sizes before and
+    after, the fraction of pixels stored and the time taken.
+    """
+    optimize_frame_deltas = get_frame_delta_optimizer()
+    start = time.perf_counter()
+    before = os.path.getsize(input_path)
+    try:
+        stored = optimize_frame_deltas(input_path, output_path, tolerance, cancel)
+    except ValueError as e:
+        log(f"Frame deltas skipped: {e}\n")
+        stored = None
+    after = os.path.getsize(output_path) if stored is not None else before
+    if after >= before:
+        shutil.copyfile(input_path, output_path)
+        after = before
+    elapsed = time.perf_counter() - start
+    if stored is not None:
+        log(f"Frame deltas: {format_file_size(before)} -> {format_file_size(after)} "
+            f"({after / before - 1:+.0%}), {stored:.0%} of pixels stored, +{elapsed:.2f}s\n")
+    return {"bytes_before": before, "bytes_after": after, "pixels_stored": stored, "time": elapsed}
+
+
+def get_encoder_backend(name):
+    """Create the encoder backend registered under name in ENCODER_BACKENDS.
+
+    Raises ValueError when the backend's requirements are missing.
+    """
+    if name == "ffmpeg":
+        return FFmpegBackend()
+    if name == "pillow":
+        try:
+            from ffgif_pillow import PillowBackend
+        except ImportError:
+            raise ValueError("The Pillow backend needs Pillow and NumPy (pip install Pillow numpy)")
+        return PillowBackend()
+    raise ValueError(f"Unknown encoder backend: {name}")
+
+
+def get_available_backends():
+    """List the encoder backends that can run on this machine."""
+    available = []
+    for name in ENCODER_BACKENDS:
+        try:
+            get_encoder_backend(name)
+        except ValueError:
+            continue
+        available.append(name)
+    return available
+
+
+def build_gif(files, output_path, framerate="4", scale="iw/2:ih/2", encode_mode="two_pass",
+              durations=None, use_cache=False, work_dir=None, log=ignore, on_status=ignore,
+              on_progress=None, cancel=None, dedupe_threshold=None, backend="ffmpeg", palette_sample="all",
+              palette_sample_amount=None, palette_scale=None, measure_palette=False, max_colors=256,
+              dither="floyd_steinberg", target_bytes=None, predecode=False, frame_deltas=None):
+    """Build a GIF from files and return a summary dict.
+
+    framerate is a string as passed to FFmpeg, scale an FFmpeg scale string.
+    backend names an entry of ENCODER_BACKENDS; encode_mode, use_cache,
+    predecode and the palette options (see FFmpegBackend.encode) only apply
+    to the FFmpeg backend. With target_bytes, search_target_settings first
+    picks a scale, frame step, color count and dither expected to fit, then
+    the GIF is encoded once with them. Temporary files go into a private
+    folder inside work_dir (default: see get_scratch_dir), so concurrent
+    builds never share them. The GIF is written to a hidden file next to
+    output_path and renamed into place once complete. log gets FFmpeg
+    output, on_status short status messages and on_progress a percentage
+    plus a progress description. With dedupe_threshold, near-duplicate
+    frames (see find_duplicate_frames) are merged into the previous frame's
+    duration before encoding. With frame_deltas (a tolerance, see
+    apply_frame_deltas), the encoded GIF is rewritten to store only each
+    frame's changed pixels. The summary includes each step's span, this
+    process's CPU time and I/O, and the totals over the FFmpeg processes run
+    (see CancelToken.get_usage). Raises ValueError for bad input or a
+    missing backend, subprocess.CalledProcessError when FFmpeg fails and
+    BuildCancelled when cancel (a CancelToken) is cancelled.
+    """
+    if not files:
+        raise ValueError("No files selected")
+    if encode_mode not in ENCODE_MODES:
+        raise ValueError(f"Unknown encode mode: {encode_mode}")
+    encoder = get_encoder_backend(backend)
+    if target_bytes is not None and backend != "ffmpeg":
+        raise ValueError("Target size needs the FFmpeg encoder")
+    if frame_deltas is not None:
+        get_frame_delta_optimizer()
+    if backend == "ffmpeg" or dedupe_threshold is not None:
+        check_single_format(files)
+    # A token of our own still collects FFmpeg's resource usage
+    cancel = cancel or CancelToken()
+
+    work_dir = tempfile.mkdtemp(prefix=".ffgif-", dir=get_scratch_dir(work_dir))
+    temp_output_path = get_temp_output_path(output_path, work_dir)
+    temp_paths = [temp_output_path]
+    total_frames = len(files)
+    dropped_frames = 0
+    dropped_source_bytes = 0
+    target = None
+    deltas = None
+
+    memory = PeakMemoryMonitor()
+    try:
+        start_time = time.perf_counter()
+        timings = StageTimings(start_time)
+        usage = UsageMeter()
+        memory.start()
+
+        if dedupe_threshold is not None and len(files) > 1:
+            on_status("Finding duplicate frames...")
+            step_start = time.perf_counter()
+            signatures = encoder.frame_signatures(files, work_dir, log, on_progress, cancel)
+            keep = find_duplicate_frames(signatures, dedupe_threshold)
+            dropped_frames = len(files) - len(keep)
+            if dropped_frames:
+                kept = set(keep)
+                dropped_source_bytes = sum(os.path.getsize(path) for i, path in enumerate(files) if i not in kept)
+                files, durations = merge_duplicate_frames(files, keep, framerate, durations)
+                total_frames = len(files)
+            timings["dedupe"] = time.perf_counter() - step_start
+            log(f"Dropped {dropped_frames} near-duplicate frames ({format_file_size(dropped_source_bytes)} of source "
+                f"images) in {timings['dedupe']:.2f}s\n")
+
+        if target_bytes is not None:
+            step_start = time.perf_counter()
+            target = search_target_settings(encoder.ffmpeg_bin, files, framerate, scale, durations, target_bytes,
+                                            work_dir, max_colors, dither, log, on_status, cancel)
+            files, framerate, durations = step_frames(files, target["frame_step"], framerate, durations)
+            total_frames = len(files)
+            scale = multiply_scale(scale, target["scale_factor"])
+            max_colors, dither = target["max_colors"], target["dither"]
+            timings["target_search"] = time.perf_counter() - step_start
+            log(f"Target {format_file_size(target_bytes)}: scale x{target['scale_factor']:.2f}, every "
+                f"{target['frame_step']} frame(s), {max_colors} colors, {dither}, estimated "
+                f"{format_file_size(target['estimated_bytes'])} ({target['trials']} trials in "
+                f"{timings['target_search']:.2f}s)\n")
+
+        # With frame deltas, encode in the work dir and write the optimized GIF to the output
+        encode_path = os.path.join(work_dir, "encoded.gif") if frame_deltas is not None else temp_output_path
+        encode_stats = encoder.encode(
+            files, encode_path, framerate, scale, durations, work_dir, temp_paths, timings, log, on_status,
+            on_progress, cancel, encode_mode=encode_mode, use_cache=use_cache,
+            palette_sample=palette_sample, palette_sample_amount=palette_sample_amount,
+            palette_scale=palette_scale, measure_palette=measure_palette, max_colors=max_colors, dither=dither,
+            predecode=predecode)
+        if frame_deltas is not None:
+            on_status("Optimizing frame deltas...")
+            deltas = apply_frame_deltas(encode_path, temp_output_path, frame_deltas, log, cancel)
+            timings["frame_deltas"] = deltas["time"]
+        os.replace(temp_output_path, output_path)
+
+        elapsed = time.perf_counter() - start_time
+        memory.stop()
+        mode_name = ENCODE_MODES[encode_mode] if backend == "ffmpeg" else ENCODER_BACKENDS[backend]
+        if memory.peak is not None:
+            log(f"Peak memory (this process): {format_file_size(memory.peak)}\n")
+        log(f"\n{'='*50}\nComplete in {elapsed:.2f}s ({mode_name})\n{'='*50}\n")
+
+        return dict({
+            "output": output_path,
+            "frames": total_frames,
+            "bytes": os.path.getsize(output_path),
+            "backend": backend,
+            "encode_mode": encode_mode,
+            "elapsed": elapsed,
+            "fps": total_frames / max(elapsed, 1e-6),
+            "timings": dict(timings),
+            "spans": timings.spans,
+            "usage": usage.read(),
+            "ffmpeg_usage": cancel.get_usage(),
+            "dropped_frames": dropped_frames,
+            "dropped_source_bytes": dropped_source_bytes,
+            "peak_rss": memory.peak,
+            "target": target,
+            "frame_deltas": deltas,
+        }, **encode_stats)
+
+    except BuildCancelled:
+        log(f"\n{'='*50}\nCancelled\n{'='*50}\n")
+        raise
+
+    finally:
+        memory.stop()
+
+        # Always clean up palette, manifest and chunk files, and a half-written GIF
+        for temp_path in temp_paths:
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            except OSError:
+                pass
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parse_renditions(spec):
+    """Parse a rendition list like "gif:1, gif:0.5, webp:0.5, mp4" into (format, factor) pairs.
+
+    The factor multiplies the chosen scale and defaults to 1. Raises
+    ValueError for unknown formats, bad factors or duplicates.
+    """
+    renditions = []
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        fmt, _, factor = item.partition(":")
+        if fmt not in RENDITION_FORMATS:
+            raise ValueError(f"Unknown rendition format: {fmt} (use {', '.join(RENDITION_FORMATS)})")
+        try:
+            factor = float(factor) if factor else 1.0
+        except ValueError:
+            raise ValueError(f"Bad rendition scale: {item}")
+        if factor <= 0:
+            raise ValueError(f"Rendition scale must be positive: {item}")
+        if (fmt, factor) in renditions:
+            raise ValueError(f"Duplicate rendition: {item}")
+        renditions.append((fmt, factor))
+    if not renditions:
+        raise ValueError("No renditions given")
+    return renditions
+
+
+def get_rendition_path(output_path, fmt, factor):
+    """Name a rendition after the main output, e.g. shoot_0.5x.gif."""
+    stem = os.path.splitext(output_path)[0]
+    return f"{stem}_{factor:g}x{RENDITION_FORMATS[fmt][1]}"
+
+
+def get_rendition_output_args(fmt, framerate, durations=None):
+    """Build the encoder and timing args for one rendition output."""
+    if fmt == "gif":
+        return [*get_timing_args(framerate, durations), "-loop", "0"]
+    timing_args = ["-r", framerate] if durations is None else ["-fps_mode", "passthrough"]
+    if fmt == "webp":
+        return ["-c:v", "libwebp_anim", "-quality", "80", "-loop", "0", *timing_args]
+    return ["-c:v", "libx264", "-crf", "20", "-pix_fmt", "yuv420p", "-movflags", "+faststart", *timing_args]
+
+
+def build_renditions(files, output_path, renditions, framerate="4", scale="iw/2:ih/2", durations=None,
+                     work_dir=None, log=ignore, on_status=ignore, on_progress=None, cancel=None):
+    """Build several outputs from one decode of files in a single FFmpeg run.
+
+    renditions is a list of (format, factor) pairs (see parse_renditions);
+    each output is scaled to scale times factor, and every GIF gets its own
+    palette. Outputs are named by get_rendition_path and, like build_gif's,
+    renamed into place once all are complete. Every GIF's frames are held
+    in memory until its palette is ready, as in single pass mode. Returns a
+    summary dict with per-output sizes and build_gif's telemetry. Raises
+    like build_gif.
+    """
+    if not files:
+        raise ValueError("No files selected")
+    check_single_format(files)
+    ffmpeg_bin = find_ffmpeg()
+    if ffmpeg_bin is None:
+        raise ValueError("FFmpeg not found. Please install FFmpeg.")
+
+    work_dir = tempfile.mkdtemp(prefix=".ffgif-", dir=get_scratch_dir(work_dir))
+    manifest_path = os.path.join(work_dir, "frames.ffconcat")
+    outputs = [{"format": fmt, "scale_factor": factor, "path": get_rendition_path(output_path, fmt, factor)}
+               for fmt, factor in renditions]
+    temp_paths = [get_temp_output_path(output["path"], work_dir) for output in outputs]
+    cancel = cancel or CancelToken()
+
+    memory = PeakMemoryMonitor()
+    try:
+        start_time = time.perf_counter()
+        timings = StageTimings(start_time)
+        usage = UsageMeter()
+        memory.start()
+        write_concat_manifest(files, manifest_path, framerate, durations)
+
+        # One decode, split into a frame counter plus one branch per output
+        labels = "".join(f"[r{i}]" for i in range(len(outputs)))
+        graph = [f"split={len(outputs) + 1}[count]{labels}"]
+        output_args = ["-map", "[count]", "-f", "null", "-"]
+        for i, output in enumerate(outputs):
+            chain = f"[r{i}]scale={multiply_scale(scale, output['scale_factor'])}"
+            if output["format"] == "gif":
+                chain += f",split[a{i}][b{i}];[a{i}]palettegen=stats_mode=diff[p{i}];" \
+                         f"[b{i}][p{i}]paletteuse=dither=floyd_steinberg"
+            elif output["format"] == "mp4":
+                chain += ",crop=trunc(iw/2)*2:trunc(ih/2)*2"  # H.264 needs even dimensions
+            graph.append(f"{chain}[o{i}]")
+            output_args += ["-map", f"[o{i}]",
+                            *get_rendition_output_args(output["format"], framerate, durations), temp_paths[i]]
+
+        on_status(f"Creating {len(outputs)} renditions in one pass...")
+        step_start = time.perf_counter()
+        run_ffmpeg([
+            ffmpeg_bin, "-y", "-reinit_filter", "0", "-f", "concat", "-safe", "0", "-i", manifest_path,
+            "-filter_complex", ";".join(graph), *output_args
+        ], f"Renditions: {len(outputs)} outputs from one decode", log,
+            make_step_progress(on_progress, len(files), 0, 100), cancel)
+        for output, temp_path in zip(outputs, temp_paths):
+            os.replace(temp_path, output["path"])
+        timings["encode"] = time.perf_counter() - step_start
+
+        elapsed = time.perf_counter() - start_time
+        memory.stop()
+        for output in outputs:
+            output["bytes"] = os.path.getsize(output["path"])
+            log(f"{os.path.basename(output['path'])}: {format_file_size(output['bytes'])}\n")
+        log(f"\n{'='*50}\nComplete in {elapsed:.2f}s ({len(outputs)} renditions)\n{'='*50}\n")
+
+        return {
+            "outputs": outputs,
+            "frames": len(files),
+            "bytes": sum(output["bytes"] for output in outputs),
+            "elapsed": elapsed,
+            "fps": len(files) / max(elapsed, 1e-6),
+            "timings": dict(timings),
+            "spans": timings.spans,
+            "usage": usage.read(),
+            "ffmpeg_usage": cancel.get_usage(),
+            "peak_rss": memory.peak,
+        }
+
+    except BuildCancelled:
+        log(f"\n{'='*50}\nCancelled\n{'='*50}\n")
+        raise
+
+    finally:
+        memory.stop()
+
+        # Don't leave half-written outputs behind
+        for temp_path in temp_paths:
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            except OSError:
+                pass
+        shutil.rmtree(work_dir, ignore_errors=True)
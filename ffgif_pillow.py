@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Pillow + NumPy encoder backend for FFGIF Maker.
+
+Builds GIFs in-process, without the FFmpeg binary. Frames are pulled
+through a generator: decoded and scaled in a thread pool, mapped to one
+shared palette through a NumPy lookup table, LZW-compressed and written to
+the output one frame at a time, so memory use doesn't grow with the
+number of frames.
+"""
+
+import io
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from ffgif_decode import parse_scale
+from ffgif_engine import (
+    DEDUPE_SIGNATURE_SIZE, add_local_color_table, format_progress_info, get_frame_delays, ignore, parse_gif_blocks
+)
+
+# Frames sampled (evenly spaced) to build the shared palette
+PALETTE_SAMPLE_FRAMES = 32
+
+# Longest side of each sampled frame; smaller samples are faster to quantize
+PALETTE_SAMPLE_SIZE = 128
+
+# Most pixels passed to median cut; larger samples are thinned evenly
+PALETTE_SAMPLE_PIXELS = 131072
+
+# Frames decoded ahead of the writer, per worker thread
+FRAMES_IN_FLIGHT = 2
+
+# Bits per channel of the color -> palette index lookup table
+LOOKUP_BITS = 6
+
+
+def load_frame(filepath, size):
+    """Decode an image as RGB and resize it to size."""
+    with Image.open(filepath) as image:
+        # Let JPEGs decode at a reduced size when the output is much smaller
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.BICUBIC)
+        return image
+
+
+def get_palette_sample_size(size):
+    """Fit a frame size within PALETTE_SAMPLE_SIZE, never enlarging it."""
+    if max(size) <= PALETTE_SAMPLE_SIZE:
+        return size
+    ratio = PALETTE_SAMPLE_SIZE / max(size)
+    return max(1, int(size[0] * ratio)), max(1, int(size[1] * ratio))
+
+
+def build_palette(files, size):
+    """Build a 256-color palette from sample frames, shrunk to PALETTE_SAMPLE_SIZE.
+
+    Returns the palette as a (256, 3) uint8 array.
+    """
+    sample_size = get_palette_sample_size(size)
+
+    def load_sample(filepath):
+        with Image.open(filepath) as image:
+            # Let JPEGs decode at a reduced size when the sample is much smaller
+            image.draft("RGB", sample_size)
+            frame = image.convert("RGB").resize(sample_size, Image.Resampling.BOX)
+        return np.asarray(frame).reshape(-1, 3)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        return build_palette_from_pixels(np.concatenate(list(executor.map(load_sample, files))))
+
+
+def build_palette_from_pixels(pixels):
+    """Build a 256-color palette from an (N, 3) array of sampled pixels."""
+    if len(pixels) > PALETTE_SAMPLE_PIXELS:
+        pixels = pixels[::-(-len(pixels) // PALETTE_SAMPLE_PIXELS)]
+
+    # Median cut on a one-pixel-wide strip of all sampled pixels
+    strip = Image.fromarray(pixels.reshape(-1, 1, 3))
+    palette = strip.quantize(256, method=Image.Quantize.MEDIANCUT).getpalette()[:768]
+    palette += [0] * (768 - len(palette))
+    return np.array(palette, dtype=np.uint8).reshape(256, 3)
+
+
+def build_lookup_table(palette):
+    """Map every LOOKUP_BITS-per-channel color to its nearest palette index."""
+    levels = 1 << LOOKUP_BITS
+    shift = 8 - LOOKUP_BITS
+    centers = (np.arange(levels, dtype=np.float32) * (1 << shift) + (1 << shift) / 2)
+    r, g, b = np.meshgrid(centers, centers, centers, indexing="ij")
+    colors = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    # |c - p|^2 = |c|^2 - 2 c.p + |p|^2; |c|^2 doesn't change the argmin
+    palette = palette.astype(np.float32)
+    palette_norms = (palette ** 2).sum(axis=1)
+    lookup = np.empty(len(colors), dtype=np.uint8)
+    for start in range(0, len(colors), 16384):
+        block = colors[start:start + 16384]
+        distances = palette_norms - 2 * block @ palette.T
+        lookup[start:start + 16384] = distances.argmin(axis=1)
+    return lookup
+
+
+def quantize_frame(frame, lookup):
+    """Map an RGB frame to palette indices with the lookup table."""
+    pixels = np.asarray(frame) >> (8 - LOOKUP_BITS)
+    index = (pixels[..., 0].astype(np.int32) << (2 * LOOKUP_BITS)) | \
+            (pixels[..., 1].astype(np.int32) << LOOKUP_BITS) | pixels[..., 2]
+    return lookup[index]
+
+
+def iter_quantized_frames(files, size, lookup, workers=None):
+    """Yield each file as palette indices, in order, decoding in a thread pool.
+
+    Only FRAMES_IN_FLIGHT frames per worker are decoded ahead of the
+    consumer, so memory use is independent of the number of files.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    def prepare(filepath):
+        return quantize_frame(load_frame(filepath, size), lookup)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        upcoming = iter(files)
+        try:
+            for filepath in itertools.islice(upcoming, FRAMES_IN_FLIGHT * workers):
+                pending.append(executor.submit(prepare, filepath))
+            while pending:
+                indices = pending.popleft().result()
+                for filepath in itertools.islice(upcoming, 1):
+                    pending.append(executor.submit(prepare, filepath))
+                yield indices
+        finally:
+            # Stopped early (error or cancel): drop frames not yet decoded
+            for future in pending:
+                future.cancel()
+
+
+def encode_gif_header(size, palette):
+    """Return the start of a looping GIF with palette (256 colors, as bytes) as its global color table."""
+    width, height = size
+    # Global color table of 256 entries (flags 0xF7), then loop forever
+    return (b"GIF89a" + width.to_bytes(2, "little") + height.to_bytes(2, "little") + b"\xF7\x00\x00" +
+            palette + b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+
+def encode_gif_frame(indices, palette, delay, left=0, top=0, transparent=None):
+    """Return one GIF frame of palette indices shown for delay centiseconds.
+
+    The frame is drawn at (left, top) and stays on screen under the next
+    one (disposal 1); pixels set to the transparent index show through.
+    Frames encoded against the same palette (as bytes) can be joined under
+    one encode_gif_header in any order.
+    """
+    # Pillow does the LZW compression; only the image block is kept
+    image = Image.fromarray(indices, "P")
+    image.putpalette(palette)
+    buffer = io.BytesIO()
+    image.save(buffer, format="GIF", optimize=False)
+    header, color_table, _, frames = parse_gif_blocks(buffer.getvalue())
+    block = frames[0][1]
+    if color_table != palette:
+        block = add_local_color_table(block, header, color_table)
+    if left or top:
+        block = block[:1] + left.to_bytes(2, "little") + top.to_bytes(2, "little") + block[5:]
+    flags = 0x04 | (transparent is not None)
+    control = (b"\x21\xF9\x04" + bytes([flags]) + delay.to_bytes(2, "little") +
+               bytes([transparent or 0]) + b"\x00")
+    return control + block
+
+
+class GifStreamWriter:
+    """Writes a looping GIF with one global palette, one frame at a time."""
+
+    def __init__(self, path, size, palette):
+        self.size = size
+        self.palette = palette.tobytes()
+        self.file = open(path, "wb")
+        self.file.write(encode_gif_header(size, self.palette))
+
+    def write_frame(self, indices, delay, left=0, top=0, transparent=None):
+        """Append one frame of palette indices shown for delay centiseconds (see encode_gif_frame)."""
+        self.file.write(encode_gif_frame(indices, self.palette, delay, left, top, transparent))
+
+    def close(self):
+        """Write the trailer and close the file."""
+        self.file.write(b"\x3B")
+        self.file.close()
+
+
+class PillowBackend:
+    """Encoder backend that builds GIFs in-process with Pillow and NumPy."""
+
+    def frame_signatures(self, files, work_dir, log=ignore, on_progress=None, cancel=None):
+        """Return a tiny grayscale thumbnail per file for duplicate detection."""
+        size = (DEDUPE_SIGNATURE_SIZE, DEDUPE_SIGNATURE_SIZE)
+
+        def sign(filepath):
+            if cancel:
+                cancel.check()
+            with Image.open(filepath) as image:
+                image.draft("L", (size[0] * 8, size[1] * 8))
+                return image.convert("L").resize(size, Image.Resampling.BOX).tobytes()
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            return list(executor.map(sign, files))
+
+    def encode(self, files, output_path, framerate, scale, durations, work_dir, temp_paths, timings,
+               log=ignore, on_status=ignore, on_progress=None, cancel=None, **ffmpeg_options):
+        """Encode files into output_path, recording step times in timings.
+
+        FFmpeg-only options (encode mode, cache, palette sampling) are
+        ignored; the palette always comes from a sample of frames. Returns a
+        dict of extra result fields.
+        """
+        total_frames = len(files)
+        with Image.open(files[0]) as first:
+            # Like FFmpeg with -reinit_filter 0, every frame gets the first frame's output size
+            size = parse_scale(scale, *first.size)
+        log(f"Pillow backend: {total_frames} frames at {size[0]}x{size[1]}\n")
+
+        on_status("Generating color palette...")
+        step_start = time.perf_counter()
+        palette_files = files[::max(1, total_frames // PALETTE_SAMPLE_FRAMES)]
+        palette = build_palette(palette_files, size)
+        lookup = build_lookup_table(palette)
+        timings["palette"] = time.perf_counter() - step_start
+        log(f"Palette from {len(palette_files)} sampled frames in {timings['palette']:.2f}s\n")
+
+        on_status("Creating GIF...")
+        step_start = time.perf_counter()
+        delays = get_frame_delays(total_frames, framerate, durations)
+
+        writer = GifStreamWriter(output_path, size, palette)
+        try:
+            for i, indices in enumerate(iter_quantized_frames(files, size, lookup)):
+                if cancel:
+                    cancel.check()
+                writer.write_frame(indices, delays[i])
+                if on_progress:
+                    elapsed = time.perf_counter() - step_start
+                    on_progress(100 * (i + 1) / total_frames,
+                                format_progress_info(i + 1, total_frames, (i + 1) / max(elapsed, 1e-6)))
+        finally:
+            writer.close()
+        timings["encode"] = time.perf_counter() - step_start
+        log(f"Encoded {total_frames} frames in {timings['encode']:.2f}s\n")
+        return {"cache_hits": None, "palette_frames": len(palette_files), "palette_delta_e": None}
+
+
+def map_to_palette(pixels, palette):
+    """Map RGB pixels that are exactly palette colors to their palette indices.
+
+    Raises ValueError for any pixel not in the palette.
+    """
+    palette_keys = (palette.astype(np.int32) << np.array([16, 8, 0])).sum(axis=1)
+    order = np.argsort(palette_keys, kind="stable")
+    sorted_keys = palette_keys[order]
+    keys = (pixels.astype(np.int32) << np.array([16, 8, 0])).sum(axis=-1)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    if not (sorted_keys[positions] == keys).all():
+        raise ValueError("GIF frames use colors outside the global palette")
+    return order[positions].astype(np.uint8)
+
+
+def optimize_frame_deltas(input_path, output_path, tolerance=0, cancel=None):
+    """Rewrite a GIF so each frame only stores what changed since the previous one.
+
+    Each frame is compared (vectorized) with the frame on screen before it;
+    pixels that differ by at most tolerance (0-255, per channel) count as
+    unchanged and keep showing the old pixel. The frame is cropped to the
+    bounding box of changed pixels, unchanged pixels inside it become
+    transparent, and every frame stays on screen under the next (disposal
+    1). The GIF must use one global palette, as both backends write.
+    Returns the fraction of pixels stored, relative to full frames.
+    """
+    with Image.open(input_path) as gif:
+        size = gif.size
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        colors = np.array(gif.getpalette()[:768], dtype=np.uint8).reshape(-1, 3)
+        palette[:len(colors)] = colors
+
+        writer = GifStreamWriter(output_path, size, palette)
+        try:
+            shown = None
+            transparent = None
+            stored_pixels = 0
+            total_pixels = 0
+            for index in itertools.count():
+                if cancel:
+                    cancel.check()
+                try:
+                    gif.seek(index)
+                except EOFError:
+                    break
+                # Pillow composites each frame over the previous ones, as a viewer would
+                frame = np.asarray(gif.convert("RGB"))
+                delay = max(1, round(gif.info.get("duration", 100) / 10))
+                total_pixels += size[0] * size[1]
+
+                if shown is None:
+                    indices = map_to_palette(frame, palette)
+                    # An index the first frame doesn't use can mark unchanged pixels
+                    unused = np.flatnonzero(np.bincount(indices.ravel(), minlength=256) == 0)
+                    transparent = int(unused[-1]) if unused.size else None
+                    writer.write_frame(indices, delay)
+                    shown = frame.copy()
+                    stored_pixels += indices.size
+                    continue
+
+                changed = np.abs(frame.astype(np.int16) - shown).max(axis=2) > tolerance
+                rows = np.flatnonzero(changed.any(axis=1))
+                if not rows.size:
+                    # Nothing changed: one transparent (or repeated) pixel keeps the timing
+                    pixel = np.array([[transparent]], dtype=np.uint8) if transparent is not None else \
+                        map_to_palette(shown[:1, :1], palette)
+                    writer.write_frame(pixel, delay, transparent=transparent)
+                    stored_pixels += 1
+                    continue
+                cols = np.flatnonzero(changed.any(axis=0))
+                top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+                box_changed = changed[top:bottom, left:right]
+                box = np.where(box_changed[..., None], frame[top:bottom, left:right],
+                               shown[top:bottom, left:right])
+                indices = map_to_palette(box, palette)
+                if transparent is not None and (indices[box_changed] != transparent).all():
+                    indices[~box_changed] = transparent
+                    frame_transparent = transparent
+                else:
+                    # The spare index is in use after all; unchanged pixels repeat the old ones
+                    frame_transparent = None
+                writer.write_frame(indices, delay, int(left), int(top), frame_transparent)
+                shown[top:bottom, left:right] = box
+                stored_pixels += indices.size
+        finally:
+            writer.close()
+    return stored_pixels / max(1, total_pixels)
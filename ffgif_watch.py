@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""Watch-folder mode for FFGIF Maker: a rolling GIF of the latest frames.
+
+Tails a folder that a camera drops images into and keeps a GIF of the last
+N frames up to date, refreshing it every few seconds while frames arrive.
+Each frame is decoded, mapped to a shared palette and LZW-compressed once,
+when it arrives; a refresh only encodes the new frames and joins the
+already-encoded ones, so its work grows with the new frames rather than
+with everything seen so far.
+
+The palette comes from a sample of the frames in the window. It is only
+rebuilt (re-encoding the window once) when new frames stop fitting it,
+e.g. as daylight fades. New files are found with inotify on Linux, or by
+polling the folder elsewhere. Needs Pillow and NumPy; not FFmpeg.
+
+Prints one JSON line per refresh to stdout. Stop with Ctrl+C.
+
+Examples:
+    python ffgif_watch.py /mnt/camera/ -o latest.gif
+    python ffgif_watch.py incoming/ -o latest.gif --window 200 --interval 30 -r 10 --scale 0.25
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ffgif_decode import parse_scale
+from ffgif_engine import IMAGE_EXTENSIONS, get_frame_delays, ignore, make_scale_string
+from ffgif_pillow import (
+    build_lookup_table, build_palette_from_pixels, encode_gif_frame, encode_gif_header, get_palette_sample_size,
+    load_frame, quantize_frame
+)
+from PIL import Image
+
+# Seconds between folder scans when inotify isn't available
+POLL_INTERVAL = 1.0
+
+# inotify events for a file finished writing or moved into the folder, and for lost events
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Rebuild the palette once new frames map to it this much worse than the window did
+PALETTE_DRIFT = 1.5
+
+# Quantization error (mean RGB distance) always tolerated, so near-perfect palettes don't rebuild on noise
+PALETTE_MIN_ERROR = 4.0
+
+
+def open_inotify(folder):
+    """Return a non-blocking inotify descriptor watching folder for new files, or None if unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class FolderWatcher:
+    """Reports image files as they appear in a folder, each once, oldest batch first.
+
+    With inotify, a file counts once it is closed after writing or moved
+    in. When polling, it counts once its size stays the same between two
+    scans, so half-written files are skipped until complete.
+    """
+
+    def __init__(self, folder, use_inotify=True):
+        self.folder = folder
+        self.seen = set()
+        self.sizes = {}
+        # Watch before the first scan, so no file slips in between
+        self.inotify_fd = open_inotify(folder) if use_inotify else None
+
+    def existing(self):
+        """Return the images already in the folder, by name."""
+        names = sorted(name for name in os.listdir(self.folder) if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.seen.update(names)
+        return [os.path.join(self.folder, name) for name in names]
+
+    def poll(self):
+        """Scan the folder for new images whose size has settled."""
+        ready = []
+        sizes = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name in self.seen or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                try:
+                    sizes[entry.name] = entry.stat().st_size
+                except OSError:
+                    continue
+                if self.sizes.get(entry.name) == sizes[entry.name]:
+                    ready.append(entry.name)
+        for name in ready:
+            del sizes[name]
+        self.sizes = sizes
+        return ready
+
+    def read_events(self):
+        """Read pending inotify events; return new image names, or None if events were lost."""
+        names = []
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.inotify_fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                overflow = overflow or bool(mask & IN_Q_OVERFLOW)
+                if name and name not in self.seen and name.lower().endswith(IMAGE_EXTENSIONS):
+                    names.append(name)
+        return None if overflow else names
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds and return the paths of new images, sorted by name."""
+        if self.inotify_fd is None:
+            time.sleep(min(timeout, POLL_INTERVAL))
+            names = self.poll()
+        else:
+            select.select([self.inotify_fd], [], [], timeout)
+            names = self.read_events()
+            if names is None:
+                # The kernel dropped events; find what we missed by scanning
+                names = [name for name in os.listdir(self.folder)
+                         if name not in self.seen and name.lower().endswith(IMAGE_EXTENSIONS)]
+        names = sorted(set(names))
+        self.seen.update(names)
+        return [os.path.join(self.folder, name) for name in names]
+
+    def close(self):
+        """Stop watching."""
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+
+class RollingGif:
+    """A GIF of the last window frames, kept as frames encoded against one palette.
+
+    add_frames encodes only the frames it is given; write joins the encoded
+    frames under the palette's header.
+    """
+
+    def __init__(self, path, window, framerate, scale, log=ignore):
+        self.path = path
+        self.log = log
+        self.window = window
+        self.scale = scale
+        self.delay = get_frame_delays(1, framerate)[0]
+        self.size = None
+        self.palette = None
+        self.lookup = None
+        self.palette_error = None
+        self.frame_count = 0
+        # Mean quantization error of the latest frames, see measure_error
+        self.last_error = None
+        # Per frame in the window: source path and encoded GIF frame
+        self.files = deque(maxlen=window)
+        self.blocks = deque(maxlen=window)
+
+    def load(self, files):
+        """Decode files at the output size, in a thread pool.
+
+        Returns (path, frame, sample pixels) per file; files that can't be
+        read (half-written, corrupt or already deleted) are logged and left out.
+        """
+        def prepare(filepath):
+            try:
+                if self.size is None:
+                    with Image.open(filepath) as first:
+                        # Like the encoders, every frame gets the first frame's output size
+                        self.size = parse_scale(self.scale, *first.size)
+                frame = load_frame(filepath, self.size)
+            except (OSError, ValueError, SyntaxError) as e:
+                self.log(f"Skipping {filepath}: {e}\n")
+                return None
+            sample = np.asarray(frame.resize(get_palette_sample_size(self.size), Image.Resampling.BOX))
+            return filepath, frame, sample.reshape(-1, 3)
+
+        # The first readable file fixes the output size before the rest load in parallel
+        loaded = []
+        files = iter(files)
+        for filepath in files:
+            loaded.append(prepare(filepath))
+            if self.size is not None:
+                break
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            loaded.extend(executor.map(prepare, files))
+        return [item for item in loaded if item]
+
+    def measure_error(self, samples):
+        """Mean RGB distance between sampled pixels and the palette colors they map to."""
+        pixels = np.concatenate(samples)
+        mapped = self.palette[quantize_frame(pixels, self.lookup)]
+        return float(np.sqrt(((pixels.astype(np.float32) - mapped) ** 2).sum(axis=1)).mean())
+
+    def set_palette(self, samples):
+        """Build the palette from sampled pixels and note how well they fit it."""
+        self.palette = build_palette_from_pixels(np.concatenate(samples))
+        self.lookup = build_lookup_table(self.palette)
+        self.palette_error = self.last_error = self.measure_error(samples)
+
+    def add_frames(self, files):
+        """Append files to the window, encoding only them unless the palette has to be rebuilt.
+
+        Only the last window files are decoded; earlier ones would be pushed
+        straight out again. Returns True if the palette was rebuilt.
+        """
+        self.frame_count += len(files)
+        loaded = self.load(files[-self.window:])
+        if not loaded:
+            return False
+        samples = [sample for _, _, sample in loaded]
+
+        rebuilt = False
+        if self.palette is None:
+            self.set_palette(samples)
+        else:
+            self.last_error = self.measure_error(samples)
+        if self.last_error > max(self.palette_error, PALETTE_MIN_ERROR) * PALETTE_DRIFT:
+            # The scene has moved away from the palette: rebuild it from the whole window and re-encode
+            kept = self.window - len(loaded)
+            old_files = list(self.files)[-kept:] if kept > 0 else []
+            self.files.clear()
+            self.blocks.clear()
+            loaded = self.load(old_files) + loaded
+            self.set_palette([sample for _, _, sample in loaded])
+            rebuilt = True
+
+        palette = self.palette.tobytes()
+        for filepath, frame, _ in loaded:
+            self.files.append(filepath)
+            self.blocks.append(encode_gif_frame(quantize_frame(frame, self.lookup), palette, self.delay))
+        return rebuilt
+
+    def write(self):
+        """Write the GIF atomically: to a hidden file next to it, then renamed over it. Returns its size."""
+        if not self.blocks:
+            return None
+        folder, name = os.path.split(os.path.abspath(self.path))
+        stem, ext = os.path.splitext(name)
+        temp_path = os.path.join(folder, f".{stem}.{os.getpid()}.tmp{ext}")
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(encode_gif_header(self.size, self.palette.tobytes()))
+                for block in self.blocks:
+                    f.write(block)
+                f.write(b"\x3B")
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return os.path.getsize(self.path)
+
+
+def refresh(gif, files):
+    """Add new frames to the rolling GIF, rewrite it and return a JSON-ready summary."""
+    start = time.perf_counter()
+    rebuilt = gif.add_frames(files)
+    size = gif.write()
+    return {
+        "time": time.time(),
+        "frames": gif.frame_count,
+        "new": len(files),
+        "window": len(gif.blocks),
+        "palette_error": gif.last_error,
+        "palette_rebuilt": rebuilt,
+        "bytes": size,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a GIF of the latest frames dropped into a folder.")
+    parser.add_argument("folder", help="folder to watch for new images")
+    parser.add_argument("-o", "--output", required=True, help="GIF to keep up to date")
+    parser.add_argument("--window", type=int, default=100, help="frames in the GIF: the last N (default: 100)")
+    parser.add_argument("--interval", type=float, default=10,
+                        help="seconds between refreshes while frames arrive (default: 10)")
+    parser.add_argument("-r", "--framerate", default="4", help="frames per second (default: 4)")
+    parser.add_argument("--scale", type=float, default=0.5, help="scale factor (default: 0.5)")
+    parser.add_argument("--poll", action="store_true", help="scan the folder instead of using inotify")
+    args = parser.parse_args(argv)
+
+    try:
+        if float(args.framerate) <= 0:
+            parser.error("frame rate must be a positive number")
+    except ValueError:
+        parser.error("frame rate must be a valid number")
+    if args.window < 1:
+        parser.error("window must be at least 1")
+    if args.interval <= 0:
+        parser.error("interval must be positive")
+    if args.scale <= 0:
+        parser.error("scale factor must be positive")
+    if not os.path.isdir(args.folder):
+        parser.error(f"folder not found: {args.folder}")
+
+    watcher = FolderWatcher(args.folder, use_inotify=not args.poll)
+    print(f"Watching {args.folder} ({'polling' if watcher.inotify_fd is None else 'inotify'})...", file=sys.stderr)
+    gif = RollingGif(args.output, args.window, args.framerate, make_scale_string(factor=args.scale),
+                     log=sys.stderr.write)
+    try:
+        # Frames already there: only the last window are decoded
+        existing = watcher.existing()
+        if existing:
+            print(json.dumps(refresh(gif, existing)), flush=True)
+        while True:
+            deadline = time.monotonic() + args.interval
+            new_files = []
+            while (remaining := deadline - time.monotonic()) > 0:
+                new_files.extend(watcher.wait(remaining))
+            if new_files:
+                print(json.dumps(refresh(gif, new_files)), flush=True)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Parallel chunks and the Pillow encoder must give every frame the same GIF delay as two pass."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ffgif_engine import (  # noqa: E402
+    build_gif, find_ffmpeg, get_available_backends, make_scale_string, read_gif_blocks
+)
+
+
+def read_delays(path):
+    """Return each frame's Graphic Control Extension delay (centiseconds)."""
+    delays = []
+    for extensions, _ in read_gif_blocks(path)[3]:
+        start = extensions.index(b"\x21\xf9\x04")
+        delays.append(int.from_bytes(extensions[start + 4:start + 6], "little"))
+    return delays
+
+
+@unittest.skipUnless(find_ffmpeg(), "needs FFmpeg")
+class FrameTimingTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+        subprocess.run([
+            find_ffmpeg(), "-v", "error", "-f", "lavfi", "-i", "testsrc=size=64x48:rate=10",
+            "-frames:v", "57", os.path.join(self.work_dir.name, "frame_%03d.png")
+        ], check=True)
+        self.files = sorted(os.path.join(self.work_dir.name, name) for name in os.listdir(self.work_dir.name))
+
+    def build(self, framerate, encode_mode, backend="ffmpeg"):
+        output_path = os.path.join(self.work_dir.name, f"{backend}_{encode_mode}_{framerate}.gif")
+        # Four chunks even on a single-core machine
+        with mock.patch("os.cpu_count", return_value=4):
+            build_gif(self.files, output_path, framerate, make_scale_string(factor=1), encode_mode, None,
+                      work_dir=self.work_dir.name, backend=backend)
+        return read_delays(output_path)
+
+    def test_delays_match_two_pass(self):
+        # Frame times that aren't whole centiseconds round differently frame to frame
+        for framerate in ("3", "7", "8"):
+            with self.subTest(framerate=framerate):
+                self.assertEqual(self.build(framerate, "parallel"), self.build(framerate, "two_pass"))
+
+    @unittest.skipUnless("pillow" in get_available_backends(), "needs Pillow and NumPy")
+    def test_pillow_delays_match_ffmpeg(self):
+        for framerate in ("3", "7", "8"):
+            with self.subTest(framerate=framerate):
+                self.assertEqual(self.build(framerate, "two_pass", "pillow"), self.build(framerate, "two_pass"))
+
+
+if __name__ == "__main__":
+    unittest.main()